@@ -0,0 +1,241 @@
+
+# Benchmarks of the numeric kernels and of the plot pipeline.
+
+# The data is synthetic (solar_ephemeris.py, no network): a location-year
+# north of the Arctic Circle in a leap year (with days when the sun, or the
+# twilight, does not set or rise), 30 years at the same place, and 1000
+# location-years from pole to pole in 2018-2021.
+# Each kernel is timed at each scale (the best of REPEAT timings, of loops of
+# runs lasting at least MIN_SECONDS) and its peak
+# memory measured in another run (tracemalloc). The throughput counts the
+# location-years each kernel covers: the one-year kernels (monthly results
+# of one calendar year) cover one year of each dataset, however long it is.
+# The full plot pipeline (plot_batch.plot_batch, PIPELINE_WORKERS processes)
+# is timed on the single location-year and on PIPELINE_LOCATIONS location-years;
+# not on the 30 years (the plots are of one year) nor on the 1000 locations
+# (which would take hours). Its peak memory is measured on the single location-year.
+# The results are compared with the saved baseline, if there is one.
+#
+# Usage:
+# python3 benchmark.py            run, and compare with BASELINE_PATH
+# python3 benchmark.py --save     run, and save the results as the baseline
+# python3 benchmark.py --quick    only the small scales, no pipeline
+
+import os
+import io
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+import contextlib
+
+import numpy as np
+
+import solar_ephemeris
+from clock_policy import ClockPolicy
+from daylight_core import average_daylight_by_month, average_daylight_sweep, sunny_mornings_by_month, \
+                          sunny_mornings_table, weave_carpet, average_daylight_by_year_month, sunny_mornings_by_year_month
+
+
+# -----------------------------------------
+# ----------- CONFIG ----------------------
+# -----------------------------------------
+
+BASELINE_PATH = 'benchmark_baseline.json'
+
+REPEAT = 3
+# Each timing lasts at least this long
+MIN_SECONDS = 0.2
+
+# Slower than the baseline by more than this factor is reported
+TOLERANCE = 1.2
+
+# Location-years of the larger pipeline benchmark, and its worker processes
+PIPELINE_LOCATIONS = 10
+PIPELINE_WORKERS = 1
+
+# -----------------------------------------
+# -----------------------------------------
+# -----------------------------------------
+
+
+def synthetic_data( lat, lng, start_year, end_year=None ):
+    # Columns in the format of SunStore.columns
+    days = solar_ephemeris.date_range( '%d-01-01' % start_year, '%d-12-31' % (end_year or start_year) )
+    data = solar_ephemeris.solar_events( lat, lng, days )
+    data['date'] = days
+    return data
+
+
+def synthetic_locations( number_of_locations ):
+    # Latitudes from pole to pole, longitudes around the globe, years 2018-2021
+    lats = np.linspace( -89, 89, number_of_locations )
+    lngs = ( np.arange( number_of_locations ) * 137.5 ) % 360 - 180
+    return [ synthetic_data( lats[ind], lngs[ind], 2018 + ind % 4 ) for ind in range( number_of_locations ) ]
+
+
+def scales( quick=False ):
+    # Name -> list of datasets
+    tromso = ( 69.65, 18.96 )
+    scales = { '1 year': [ synthetic_data( *tromso, 2020 ) ],
+               '30 years': [ synthetic_data( *tromso, 1991, 2020 ) ] }
+    if not quick:
+        scales['1000 locations'] = synthetic_locations( 1000 )
+    return scales
+
+
+def kernels():
+    # Name -> (function of (data, dst_policy), whether it covers only one year of the data)
+    wake_hours = np.arange(5,12)
+    start_times = np.append( wake_hours, wake_hours+9 )*3600
+    stop_times = np.append( wake_hours+16, wake_hours+15 )*3600
+    return {
+        'average_daylight_by_month': ( lambda data, policy: average_daylight_by_month( data, 7*3600, 23*3600, policy ), True ),
+        'average_daylight_sweep': ( lambda data, policy: average_daylight_sweep( data, start_times, stop_times, [ ClockPolicy(0), ClockPolicy(-3600), policy ] ), True ),
+        'sunny_mornings_by_month': ( lambda data, policy: sunny_mornings_by_month( data, 7*3600, policy ), True ),
+        'sunny_mornings_table': ( lambda data, policy: sunny_mornings_table( data, policy ), True ),
+        'average_daylight_by_year_month': ( lambda data, policy: average_daylight_by_year_month( data, 7*3600, 23*3600, policy ), False ),
+        'sunny_mornings_by_year_month': ( lambda data, policy: sunny_mornings_by_year_month( data, 7*3600, policy ), False ),
+        'weave_carpet': ( lambda data, policy: weave_carpet( data ), False ),
+    }
+
+
+def location_years( datasets, one_year=False ):
+    # Location-years covered by a kernel
+    return sum( min( len( data['date'] )/365.25, 1 ) if one_year else len( data['date'] )/365.25 for data in datasets )
+
+
+def measure( run, repeat=REPEAT, min_seconds=MIN_SECONDS, memory=True ):
+    # (best time in seconds, peak memory in MiB, or None if not memory) of run().
+    # Fast runs are timed in loops of at least min_seconds (like timeit).
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range( loops ):
+            run()
+        seconds = time.perf_counter() - start
+        if seconds >= min_seconds:
+            break
+        loops *= 10
+
+    times = [ seconds/loops ]
+    for _ in range( repeat-1 ):
+        start = time.perf_counter()
+        for _ in range( loops ):
+            run()
+        times.append( ( time.perf_counter() - start )/loops )
+
+    if not memory:
+        return min( times ), None
+
+    tracemalloc.start()
+    run()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return min( times ), peak / 2**20
+
+
+def benchmark_kernels( quick=False ):
+    results = {}
+    for scale_name, datasets in scales( quick ).items():
+        policies = [ ClockPolicy.with_zone_dst( -3600, data['date'], 'Europe/London' ) for data in datasets ]
+
+        for kernel_name, (kernel, one_year) in kernels().items():
+            def run():
+                for data, policy in zip( datasets, policies ):
+                    kernel( data, policy )
+            seconds, peak = measure( run )
+            results[ '%s @ %s' % (kernel_name, scale_name) ] = { 'seconds': seconds, 'location_years_per_second': location_years( datasets, one_year )/seconds,
+                                                                 'peak_mib': peak }
+    return results
+
+
+def write_locations( datasets, prefix ):
+    # Pickles of the datasets in the format of get_data.py,
+    # and their locations for plot_batch
+    import pandas as pd
+
+    locations = []
+    for ind, data in enumerate( datasets ):
+        data_table = pd.DataFrame( { 'date': data['date'].astype(object) } )
+        for name in solar_ephemeris.col_names[1:]:
+            data_table[name] = data[name]
+
+        loc = '%s%03d' % (prefix, ind)
+        year = int( data['date'][0].astype('datetime64[Y]').astype(int) ) + 1970
+        data_table.to_pickle( '%s%d.pkl' % (loc, year) )
+        locations.append( ( loc, ' í prófun', year, 1, 'Europe/London' ) )
+    return locations
+
+
+def benchmark_pipeline():
+    # plot_batch.plot_batch on the '1 year' data and on PIPELINE_LOCATIONS
+    # location-years, with each carpet renderer
+    import plot_batch
+
+    pipeline_scales = { '1 year': [ synthetic_data( 69.65, 18.96, 2020 ) ],
+                        '%d locations' % PIPELINE_LOCATIONS: synthetic_locations( PIPELINE_LOCATIONS ) }
+
+    results = {}
+    cwd = os.getcwd()
+    work_dir = tempfile.mkdtemp()
+    try:
+        os.chdir( work_dir )
+        for scale_ind, (scale_name, datasets) in enumerate( pipeline_scales.items() ):
+            locations = write_locations( datasets, 'B%d' % scale_ind )
+            for renderer in [ 'matplotlib', 'raster' ]:
+                def run():
+                    with contextlib.redirect_stdout( io.StringIO() ):
+                        plot_batch.plot_batch( locations, PIPELINE_WORKERS, renderer, rebuild_all=True, store_path='no_store' )
+                # The peak memory of one location-year is that of many (run again
+                # under tracemalloc, which is several times slower)
+                seconds, peak = measure( run, repeat=1, min_seconds=0, memory=( len(locations) == 1 ) )
+                results[ 'pipeline (%s carpets) @ %s' % (renderer, scale_name) ] = { 'seconds': seconds, 'location_years_per_second': len(locations)/seconds,
+                                                                                     'peak_mib': peak }
+    finally:
+        os.chdir( cwd )
+        shutil.rmtree( work_dir )
+    return results
+
+
+def print_results( results, baseline=None ):
+    print( 'Benchmark, seconds, location-years/s, peak MiB' + ( ', vs baseline' if baseline else '' ) )
+    for name, result in results.items():
+        peak = '-' if result['peak_mib'] is None else '%.1f' % result['peak_mib']
+        line = '%s, %.4f, %.1f, %s' % (name, result['seconds'], result['location_years_per_second'], peak)
+        if baseline and name in baseline:
+            ratio = result['seconds'] / baseline[name]['seconds']
+            line += ', %.2fx time' % ratio
+            if ratio > TOLERANCE:
+                line += ' SLOWER'
+        print( line )
+    if any( result['peak_mib'] is None for result in results.values() ):
+        print( "Peak MiB '-': not measured (tracemalloc would slow the run several times; the peak is that of one location-year)" )
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser( description='Benchmarks of the kernels and the plot pipeline.' )
+    parser.add_argument( '--save', action='store_true', help='save the results as the baseline' )
+    parser.add_argument( '--quick', action='store_true', help='only the small scales, no pipeline' )
+    parser.add_argument( '--baseline', default=BASELINE_PATH )
+    args = parser.parse_args()
+
+    results = benchmark_kernels( args.quick )
+    if not args.quick:
+        results.update( benchmark_pipeline() )
+
+    baseline = None
+    if os.path.exists( args.baseline ):
+        with open( args.baseline ) as f:
+            baseline = json.load( f )
+
+    print_results( results, baseline )
+
+    if args.save:
+        with open( args.baseline, 'w' ) as f:
+            json.dump( results, f, indent=1 )
+        print( 'Saved %s' % args.baseline )
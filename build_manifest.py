@@ -0,0 +1,113 @@
+
+# Manifest of the plots in a plot directory, for incremental rebuilds.
+
+# Each plot job is recorded with a hash of everything it is drawn from
+# (the plotting function, the data, clock policies, times, colours, DPI, ...),
+# the files it wrote, what it returned and what it printed.
+# A job whose hash has not changed and whose files are all still there
+# is not drawn again; its results are taken from the manifest.
+# Changes to the plotting code itself are not seen: delete the manifest
+# (or set REBUILD_ALL in plot_all.py) after changing it.
+
+import os
+import json
+import hashlib
+from datetime import date, time, datetime
+
+import numpy as np
+
+from clock_policy import ClockPolicy
+
+
+MANIFEST_NAME = 'manifest.json'
+
+
+def _update_hash( digest, value ):
+    # Add value to the hash, with its type, so that e.g. 1 and '1' differ
+    if value is None or isinstance( value, (bool, int, float, str, np.number) ):
+        digest.update( ( '%s:%r;' % (type(value).__name__, value) ).encode() )
+    elif isinstance( value, (date, time, datetime) ):
+        digest.update( ( '%s:%s;' % (type(value).__name__, value.isoformat()) ).encode() )
+    elif isinstance( value, np.ndarray ):
+        if value.dtype == object:
+            digest.update( b'objects:' )
+            for item in value.ravel():
+                _update_hash( digest, item )
+        else:
+            digest.update( ( 'array:%s:%s;' % (value.dtype.str, value.shape) ).encode() )
+            digest.update( np.ascontiguousarray( value ).tobytes() )
+    elif isinstance( value, (list, tuple) ):
+        digest.update( ( '%s:%d;' % (type(value).__name__, len(value)) ).encode() )
+        for item in value:
+            _update_hash( digest, item )
+    elif isinstance( value, dict ):
+        digest.update( ( 'dict:%d;' % len(value) ).encode() )
+        for key in sorted( value ):
+            _update_hash( digest, key )
+            _update_hash( digest, value[key] )
+    elif isinstance( value, ClockPolicy ):
+        digest.update( b'policy:' )
+        _update_hash( digest, [ value.utc_offset, value.dst_minutes, value.name ] )
+    elif callable( value ):
+        digest.update( ( 'function:%s.%s;' % (value.__module__, value.__qualname__) ).encode() )
+    elif hasattr( value, 'columns' ):
+        # A table (pandas.DataFrame)
+        digest.update( b'table:' )
+        for name in value.columns:
+            _update_hash( digest, str(name) )
+            _update_hash( digest, np.asarray( value[name] ) )
+    else:
+        raise TypeError( 'Cannot hash %s' % type(value).__name__ )
+
+
+def input_hash( *values ):
+    digest = hashlib.sha256()
+    for value in values:
+        _update_hash( digest, value )
+    return digest.hexdigest()
+
+
+def _to_json( result ):
+    if isinstance( result, np.ndarray ):
+        return { 'array': result.tolist(), 'dtype': result.dtype.str }
+    return result
+
+
+def _from_json( result ):
+    if isinstance( result, dict ) and 'array' in result:
+        return np.array( result['array'], dtype=result['dtype'] )
+    return result
+
+
+class BuildManifest:
+
+    def __init__( self, plot_dir ):
+        self.plot_dir = plot_dir
+        self.path = os.path.join( plot_dir, MANIFEST_NAME )
+
+        if os.path.exists( self.path ):
+            with open( self.path ) as f:
+                self.jobs = json.load( f )
+        else:
+            self.jobs = {}
+
+    def is_fresh( self, key, digest, outputs ):
+        # Was the job drawn from the same inputs, and are its files still there?
+        job = self.jobs.get( key )
+        return job is not None and job['hash'] == digest and job['outputs'] == list(outputs) \
+               and all( os.path.exists( os.path.join( self.plot_dir, output ) ) for output in outputs )
+
+    def result( self, key ):
+        # What the job returned, and what it printed
+        job = self.jobs[key]
+        return _from_json( job['result'] ), job['printed']
+
+    def record( self, key, digest, outputs, result, printed ):
+        self.jobs[key] = { 'hash': digest, 'outputs': list(outputs),
+                           'result': _to_json( result ), 'printed': printed }
+
+    def save( self ):
+        tmp_path = self.path + '.tmp'
+        with open( tmp_path, 'w' ) as f:
+            json.dump( self.jobs, f, indent=1 )
+        os.replace( tmp_path, self.path )
@@ -0,0 +1,109 @@
+
+# Sunshine carpets written straight to PNG files, without matplotlib.
+
+# The carpet is already an image: one uint8 code (night, twilight, sunlight)
+# for each minute (row) of each day (column). It is written as an indexed
+# PNG, with the colours in the palette, after drawing the noon line and
+# the dashed wake and sleep lines into it with other palette entries.
+# There are no axes, ticks or title: the image is the carpet itself,
+# midnight at the bottom and January 1 on the left,
+# day_width pixels per day and minutes_per_row minutes per pixel.
+#
+# Usage:
+# set CARPET_RENDERER = 'raster' in plot_all.py
+
+import zlib
+import struct
+
+import numpy as np
+
+from daylight_core import weave_carpet, carpet_pieces
+from clock_policy import UTC
+from instrument import timed
+
+
+# Palette entries
+NOON_INDEX = 3
+SLEEP_INDEX = 4
+
+
+def hex_color( color ):
+    # '#rrggbb' -> (r, g, b)
+    return tuple( int( color[i:i+2], 16 ) for i in (1, 3, 5) )
+
+
+def _chunk( kind, data ):
+    return struct.pack( '>I', len(data) ) + kind + data + struct.pack( '>I', zlib.crc32( kind + data ) )
+
+
+@timed
+def write_png( path, pixels, palette, compression=6 ):
+    # Write pixels (uint8 palette indices, shape (height, width))
+    # as an indexed PNG with the (r, g, b) colours of palette.
+    height, width = pixels.shape
+
+    # Each row starts with its filter type (0, none)
+    rows = np.zeros( (height, width+1), dtype=np.uint8 )
+    rows[:,1:] = pixels
+
+    with open( path, 'wb' ) as f:
+        f.write( b'\x89PNG\r\n\x1a\n' )
+        f.write( _chunk( b'IHDR', struct.pack( '>IIBBBBB', width, height, 8, 3, 0, 0, 0 ) ) )
+        f.write( _chunk( b'PLTE', bytes( np.array( palette, dtype=np.uint8 ).ravel() ) ) )
+        f.write( _chunk( b'IDAT', zlib.compress( rows.tobytes(), compression ) ) )
+        f.write( _chunk( b'IEND', b'' ) )
+
+
+@timed
+def carpet_pixels( utc_carpet, policy=UTC, noon_minutes=None, line_minutes=(), day_width=2, minutes_per_row=1, line_width=2, dash=8 ):
+    # Palette indices of the carpet in the time of the clock policy,
+    # with the noon line (noon_minutes in UTC) and dashed lines at line_minutes
+    minutes_in_day, number_of_days = utc_carpet.shape
+    height = minutes_in_day // minutes_per_row
+
+    # Rows from the bottom, filled from the views of the UTC carpet
+    pixels = np.empty( (height, number_of_days), dtype=np.uint8 )
+    for day1, part in carpet_pieces( utc_carpet, policy ):
+        pixels[ :, day1:day1+part.shape[1] ] = part[ minutes_per_row//2 :: minutes_per_row ][:height]
+
+    if noon_minutes is not None:
+        noon = noon_minutes + policy.minute_offsets( number_of_days )
+        noon_rows = np.round( noon / minutes_per_row ).astype(int)
+        for row in range( -(line_width//2), line_width - line_width//2 ):
+            pixels[ (noon_rows + row) % height, np.arange( number_of_days ) ] = NOON_INDEX
+
+    pixels = np.repeat( pixels, day_width, axis=1 )
+
+    dashes = ( np.arange( pixels.shape[1] ) // dash ) % 2 == 0
+    for minutes in line_minutes:
+        line_row = int( round( minutes / minutes_per_row ) )
+        for row in range( line_row - line_width//2, line_row + line_width - line_width//2 ):
+            if 0 <= row < height:
+                pixels[ row, dashes ] = SLEEP_INDEX
+
+    # Midnight at the bottom
+    return pixels[::-1]
+
+
+def write_carpet_png( path, utc_carpet, plot_colors, policy=UTC, noon_minutes=None, line_minutes=(), day_width=2, minutes_per_row=1 ):
+    # plot_colors as in sunshine_carpet.py: day, twilight, night, noon, sleep
+    day_color, twi_color, night_color, noon_color, sleep_color = plot_colors[:5]
+    palette = [ hex_color(color) for color in (night_color, twi_color, day_color, noon_color, sleep_color) ]
+
+    pixels = carpet_pixels( utc_carpet, policy, noon_minutes, line_minutes, day_width, minutes_per_row )
+    write_png( path, pixels, palette )
+
+
+def make_sunshine_carpet_raster( wake_time, sleep_time, loc_short, location_name, year, fig_dpi, plot_colors, utc_data, shift_policy, dst_policy ):
+    # The three carpets of make_sunshine_carpet_plot (same arguments and file names)
+    # written with write_carpet_png; location_name and fig_dpi are not used.
+
+    utc_carpet = weave_carpet( utc_data )
+    noon_minutes = np.asarray( utc_data['noon'], dtype=float )/60
+
+    wake_minutes = wake_time.hour*60 + wake_time.minute
+    sleep_minutes = sleep_time.hour*60 + sleep_time.minute
+
+    for policy, name in [ (UTC, 'utc'), (shift_policy, 'shift'), (dst_policy, 'dst') ]:
+        write_carpet_png( '%s%d-carpet-%s.png' % (loc_short, year, name), utc_carpet, plot_colors, policy,
+                          noon_minutes, (wake_minutes, sleep_minutes) )
@@ -0,0 +1,179 @@
+
+# Run-length encoded sunshine carpets.
+
+# A carpet (see sunshine_carpet.py) is night, twilight or sunlight
+# for each minute of each day, but it changes only a few times a day.
+# RunLengthCarpet keeps only the times (in seconds from the first midnight)
+# where it changes and the code from each of them on, so it is exact to
+# the second and takes a few kilobytes per year. It is rasterized
+# at any resolution (and in any clock policy) when it is displayed,
+# and the time spent in each code is counted directly from the runs.
+
+import numpy as np
+
+from clock_policy import UTC
+
+
+NIGHT_CODE = 0
+TWI_CODE = 1
+DAY_CODE = 2
+
+seconds_in_day = 24*60*60
+
+
+def light_intervals( begin, end, unit_in_day ):
+    # Start and stop (in units from the first midnight) of the
+    # light (or twilight) of each day, given the units of its
+    # beginning and end on each day (unit_in_day units in a day).
+    # Very negative values mean that the light does not end:
+    # then it lasts until the beginning of the next day's light,
+    # and the next day's light begins with the previous day's end
+    # (or at the previous midnight if that does not end either).
+
+    number_of_days = len(begin)
+    t0 = np.arange( number_of_days ) * unit_in_day
+
+    does_not_begin = begin < -unit_in_day
+    does_not_end = end < -unit_in_day
+
+    # The end of the previous day
+    last_end = np.empty_like( end )
+    last_end[0] = 0
+    last_end[1:] = end[:-1]
+    last_end_missing = np.zeros( number_of_days, dtype=bool )
+    last_end_missing[1:] = does_not_end[:-1]
+
+    t1 = np.where( does_not_begin,
+                   np.where( last_end_missing, t0 - unit_in_day, t0 - unit_in_day + last_end ),
+                   t0 + begin )
+
+    # Until the next day's start (the end of the data on the last day)
+    next_t1 = np.append( t1[1:], number_of_days*unit_in_day )
+    t2 = np.where( does_not_end, next_t1, t0 + end )
+
+    return t1, t2
+
+
+def light_runs( intervals, length ):
+    # Runs of codes from painting the intervals [t1, t2) of each code
+    # (in increasing order, later codes over earlier ones) on zeros
+    # over [0, length). Returns the start of each run and its code;
+    # some runs may be empty.
+    # The start and stop of each interval are steps of +1 and -1
+    # in the number of intervals of its code covering a time;
+    # their cumulative sums in time order give the code between
+    # consecutive steps.
+
+    positions = [ np.array([0]) ]
+    codes = [ np.array([0]) ]
+    steps = [ np.array([0]) ]
+    for code, (t1, t2) in enumerate( intervals, 1 ):
+        painted = t2 > t1
+        positions += [ np.clip( t1[painted], 0, length ), np.clip( t2[painted], 0, length ) ]
+        codes += [ np.full( 2*painted.sum(), code ) ]
+        steps += [ np.ones( painted.sum(), dtype=int ), -np.ones( painted.sum(), dtype=int ) ]
+
+    positions = np.concatenate( positions )
+    codes = np.concatenate( codes )
+    steps = np.concatenate( steps )
+
+    order = np.argsort( positions, kind='stable' )
+    positions = positions[order]
+
+    # Number of intervals of each code covering the times after each step
+    cover = np.zeros( (len(intervals)+1, len(positions)), dtype=int )
+    cover[ codes[order], np.arange(len(positions)) ] = steps[order]
+    np.cumsum( cover, axis=1, out=cover )
+
+    # The highest code present
+    run_codes = np.zeros( len(positions), dtype=np.uint8 )
+    for code in range( 1, len(intervals)+1 ):
+        run_codes[ cover[code] > 0 ] = code
+
+    return positions, run_codes
+
+
+class RunLengthCarpet:
+
+    def __init__( self, starts, codes, number_of_days ):
+        # starts: increasing seconds from the first midnight, starting at 0,
+        # codes: the code from each start until the next one
+        self.starts = starts
+        self.codes = codes
+        self.number_of_days = number_of_days
+        self.length = number_of_days * seconds_in_day
+
+        # Seconds of each code before each start, for counting
+        durations = np.diff( np.append( starts, self.length ) )
+        self._before = np.zeros( (3, len(starts)) )
+        for code in range(3):
+            np.cumsum( durations*(codes == code), out=self._before[code] )
+        self._before -= durations*( codes == np.arange(3)[:,None] )
+
+    @classmethod
+    def from_data( cls, data ):
+        # Carpet of a table from get_data.py, exact to the second
+
+        number_of_days = len( data['date'] )
+
+        def seconds( name ):
+            return np.round( np.asarray( data[name], dtype=float ) ).astype(np.int64)
+
+        intervals = [ light_intervals( seconds('twilight_begin'), seconds('twilight_end'), seconds_in_day ),
+                      light_intervals( seconds('sunrise'), seconds('sunset'), seconds_in_day ) ]
+        starts, codes = light_runs( intervals, number_of_days*seconds_in_day )
+
+        # Only keep the changes: drop empty runs, then merge repeated codes
+        last = np.append( starts[1:] != starts[:-1], True )
+        starts, codes = starts[last], codes[last]
+        changes = np.append( True, codes[1:] != codes[:-1] )
+
+        return cls( starts[changes], codes[changes], number_of_days )
+
+    @property
+    def nbytes( self ):
+        return self.starts.nbytes + self.codes.nbytes
+
+    def day_runs( self, day ):
+        # Starts (seconds from the day's midnight) and codes of the runs of one day
+        t0 = day*seconds_in_day
+        first = np.searchsorted( self.starts, t0, side='right' ) - 1
+        last = np.searchsorted( self.starts, t0 + seconds_in_day, side='left' )
+        starts = np.maximum( self.starts[first:last] - t0, 0 )
+        return starts, self.codes[first:last]
+
+    def code_at( self, times ):
+        # Code at the given seconds from the first midnight (wrapping around the ends)
+        times = np.mod( times, self.length )
+        return self.codes[ np.searchsorted( self.starts, times, side='right' ) - 1 ]
+
+    def _utc_times( self, local_times, policy ):
+        # Seconds from the first midnight (UTC) of local_times (seconds from
+        # each day's midnight in the clock policy), shape (times, days)
+        offsets = np.broadcast_to( policy.offsets( self.number_of_days ), self.number_of_days )
+        day_starts = np.arange( self.number_of_days ) * seconds_in_day - offsets
+        return np.add.outer( local_times, day_starts )
+
+    def rasterize( self, resolution=60, policy=UTC ):
+        # Carpet of shape (slots in a day, days) with slots of resolution seconds,
+        # like weave_carpet for resolution=60.
+        # Each slot gets the code at its middle.
+        slots = np.arange( 0, seconds_in_day, resolution ) + resolution/2
+        return self.code_at( self._utc_times( slots, policy ) )
+
+    def _seconds_before( self, times ):
+        # Seconds of each code between the first midnight and times, shape (3,) + times.shape
+        times = np.clip( times, 0, self.length )
+        runs = np.searchsorted( self.starts, times, side='right' ) - 1
+        into_run = times - self.starts[runs]
+        before = self._before[:, runs]
+        before[ self.codes[runs], np.arange(runs.size).reshape(runs.shape) ] += into_run
+        return before
+
+    def class_seconds( self, start_time=0, stop_time=seconds_in_day, policy=UTC ):
+        # Seconds of night, twilight and sunlight (rows) on each day between
+        # start_time and stop_time (seconds from midnight in the clock policy,
+        # stop_time may be on a later day).
+        # Times outside the carpet count as nothing.
+        start, stop = self._utc_times( np.array([start_time, stop_time]), policy )
+        return self._seconds_before( stop ) - self._seconds_before( start )
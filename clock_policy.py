@@ -0,0 +1,91 @@
+
+# Clock policies: how the clock is set relative to UTC on each day.
+
+# A policy is a fixed offset from UTC plus an extra offset (DST)
+# for each day, kept as a small int16 vector of minutes.
+# The analysis functions add the offsets to the UTC data as they go,
+# so no shifted copies of the data are needed.
+
+import numpy as np
+
+import time_zones
+
+
+class ClockPolicy:
+
+    def __init__( self, utc_offset=0, dst_minutes=None, name=None ):
+        # utc_offset in seconds, dst_minutes one number for each day (or None)
+        self.utc_offset = utc_offset
+        if dst_minutes is not None:
+            dst_minutes = np.asarray( dst_minutes, dtype=np.int16 )
+        self.dst_minutes = dst_minutes
+        self.name = name
+
+    @classmethod
+    def with_dst( cls, utc_offset, dates, dst_start_date, dst_end_date, dst_hours=1, name=None ):
+        # DST from dst_start_date up to (not including) dst_end_date
+        dates = np.asarray( dates, dtype='datetime64[D]' )
+        dst_start_ind, dst_end_ind = np.searchsorted( dates, np.array( [dst_start_date, dst_end_date], dtype='datetime64[D]' ) )
+
+        dst_minutes = np.zeros( len(dates), dtype=np.int16 )
+        dst_minutes[ dst_start_ind : dst_end_ind ] = 60*dst_hours
+        return cls( utc_offset, dst_minutes, name )
+
+    @classmethod
+    def from_zone( cls, zone_name, dates, name=None ):
+        # The clock of an IANA time zone: its offset on the first day
+        # without DST, plus the rest of the offset on each day.
+        offsets = time_zones.utc_offsets( zone_name, dates )
+        dst = time_zones.dst_offsets( zone_name, dates )
+        utc_offset = int( offsets[0] - dst[0] )
+        return cls( utc_offset, (offsets - utc_offset)//60, name or zone_name )
+
+    @classmethod
+    def with_zone_dst( cls, utc_offset, dates, zone_name, name=None ):
+        # A fixed offset, with DST on the same days (and by the same amount)
+        # as in an IANA time zone, e.g. 'Europe/London' or 'America/Santiago'.
+        # The DST of the zone is counted up from its smallest offset in each
+        # year (see time_zones.py): zones with negative DST in winter, such as
+        # 'Europe/Dublin', still move the clock forward in summer.
+        return cls( utc_offset, time_zones.dst_offsets( zone_name, dates )//60, name )
+
+    def has_dst( self ):
+        return self.dst_minutes is not None and self.dst_minutes.any()
+
+    def offsets( self, number_of_days=None ):
+        # Offset from UTC in seconds on each day
+        if self.dst_minutes is None:
+            if number_of_days is None:
+                return self.utc_offset
+            return np.full( number_of_days, self.utc_offset )
+        return self.utc_offset + 60*self.dst_minutes.astype(np.int32)
+
+    def minute_offsets( self, number_of_days ):
+        # Offset from UTC in whole minutes on each day
+        offsets = np.broadcast_to( self.offsets( number_of_days ), number_of_days )
+        return np.round( offsets/60 ).astype(int)
+
+    def label( self ):
+        if self.name is not None:
+            return self.name
+        if self.utc_offset == 0:
+            label = 'UTC'
+        else:
+            label = 'UTC%+g' % (self.utc_offset/3600)
+        if self.has_dst():
+            label += ' + DST'
+        return label
+
+    def __repr__( self ):
+        return 'ClockPolicy(%s)' % self.label()
+
+
+UTC = ClockPolicy( 0 )
+
+
+def policy_offsets( policy, number_of_days=None ):
+    # Offsets in seconds from a ClockPolicy,
+    # or from a number (or one number for each day) of seconds.
+    if isinstance( policy, ClockPolicy ):
+        return policy.offsets( number_of_days )
+    return policy
@@ -0,0 +1,115 @@
+
+# Bins of days, for aggregating per-day results.
+
+# A binning is (labels, names): the bin of each day (an index into names,
+# or -1 for days in no bin) and the names of the bins. Months, (year, month),
+# ISO weeks and seasons starting on any days are here, but any array of labels
+# will do. reduce_bins sums (or averages) per-day values in the bins in one
+# bincount, counting only the days of an optional mask, e.g. workday_mask
+# for workdays without weekends and holidays.
+# Only numpy is imported.
+#
+# Example:
+# labels, names = iso_week_bins( data['date'] )
+# mask = workday_mask( data['date'], read_holidays( 'holidays.txt' ) )
+# hours = reduce_bins( seconds_by_day, labels, len(names), mask, mean=True )/3600
+
+import numpy as np
+
+
+month_names = [r'jan', r'feb', r'mar', r'apr', r'maí', r'jún', r'júl', r'ágú', r'sep', r'okt', r'nóv', r'des']
+
+# Meteorological seasons: name and first (month, day)
+SEASONS = [ (r'vetur', (12,1)), (r'vor', (3,1)), (r'sumar', (6,1)), (r'haust', (9,1)) ]
+
+
+def _days( dates ):
+    return np.asarray( dates ).astype('datetime64[D]')
+
+
+def year_month_codes( dates ):
+    # (year - first year)*12 + month - 1 of each day,
+    # and the years from the first day to the last
+    months = np.asarray( dates ).astype('datetime64[M]').astype(np.int64)
+    first_month = months.min() - months.min() % 12
+    codes = months - first_month
+    years = 1970 + first_month//12 + np.arange( codes.max()//12 + 1 )
+    return codes, years
+
+
+def month_bins( dates ):
+    # The calendar months, of any year
+    codes, _ = year_month_codes( dates )
+    return codes % 12, list( month_names )
+
+
+def year_month_bins( dates ):
+    codes, years = year_month_codes( dates )
+    return codes, [ '%d-%s' % (year, name) for year in years for name in month_names ]
+
+
+def iso_week_bins( dates ):
+    # ISO weeks 1-53 (of any year: the days at the turn of a year
+    # may be in week 1 of the next year, or week 52 or 53 of the previous)
+    days = _days( dates ).astype(np.int64)
+    # 1970-01-01 was a Thursday; weekday 0 is Monday
+    thursdays = days - ( days + 3 ) % 7 + 3
+    years = thursdays.astype('datetime64[D]').astype('datetime64[Y]')
+    weeks = ( thursdays - years.astype('datetime64[D]').astype(np.int64) ) // 7
+    return weeks, [ '%02d' % week for week in range( 1, 54 ) ]
+
+
+def season_bins( dates, seasons=SEASONS ):
+    # seasons: (name, (month, day) of its first day), each lasting
+    # until the next one begins (the last one until the first one of the next year)
+    starts = np.array( [ month*32 + day for _, (month, day) in seasons ] )
+    order = np.argsort( starts )
+
+    days = _days( dates )
+    months = days.astype('datetime64[M]')
+    day_keys = ( months.astype(np.int64) % 12 + 1 )*32 + ( days - months.astype('datetime64[D]') ).astype(np.int64) + 1
+
+    # The last start on or before each day, wrapping around the new year
+    labels = order[ np.searchsorted( starts[order], day_keys, side='right' ) - 1 ]
+    return labels, [ name for name, _ in seasons ]
+
+
+def workday_mask( dates, holidays=(), weekmask='1111100' ):
+    # True on the workdays (Monday to Friday, by default) that are not holidays
+    return np.is_busday( _days( dates ), weekmask=weekmask, holidays=_days( list(holidays) ) )
+
+
+def read_holidays( path ):
+    # Dates (YYYY-MM-DD) in a text file, one per line, with # comments
+    holidays = []
+    with open( path ) as f:
+        for line in f:
+            line = line.split('#')[0].strip()
+            if line:
+                holidays.append( line )
+    return np.array( holidays, dtype='datetime64[D]' )
+
+
+def reduce_bins( values, labels, number_of_bins, mask=None, mean=False ):
+    # Sum (or mean) of values (over the last axis, the days) in each bin,
+    # of the days in the mask, in one bincount: shape (..., number_of_bins).
+    # Means of bins without days are NaN.
+    values = np.asarray( values, dtype=float )
+    labels = np.asarray( labels, dtype=np.int64 )
+
+    counted = ( labels >= 0 ) & ( labels < number_of_bins )
+    if mask is not None:
+        counted &= np.asarray( mask, dtype=bool )
+    if not counted.all():
+        values = values[..., counted]
+        labels = labels[counted]
+
+    rows = values.reshape( -1, values.shape[-1] )
+    row_labels = np.arange( len(rows) )[:,None]*number_of_bins + labels
+    sums = np.bincount( row_labels.ravel(), weights=rows.ravel(), minlength=len(rows)*number_of_bins )
+    sums = sums.reshape( values.shape[:-1] + (number_of_bins,) )
+
+    if not mean:
+        return sums
+    with np.errstate( invalid='ignore', divide='ignore' ):
+        return sums / np.bincount( labels, minlength=number_of_bins )
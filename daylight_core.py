@@ -0,0 +1,425 @@
+
+# The numeric kernels of the plots, without matplotlib (or pandas).
+
+# Daylight in time windows (hours_of_daylight.py), sunny mornings
+# (sunny_mornings.py) and sun graphs (sunshine_carpet.py) are computed here;
+# those modules import them from here and add the plots.
+# The data is a table from get_data.py, or a dictionary of arrays
+# in the same format (e.g. SunStore.columns).
+
+import numpy as np
+
+from clock_policy import UTC, policy_offsets
+from carpet_rle import light_intervals, light_runs
+from instrument import timed
+from day_bins import year_month_codes, reduce_bins
+
+
+@timed
+def daylight_sweep_by_day( data, start_times, stop_times, policies=(UTC,) ):
+    # Seconds of sunlight and twilight of each day between
+    # start_times[i] and stop_times[i] (seconds from midnight, start_time < stop_time)
+    # for each clock in policies, in one broadcasted computation.
+    # policies[j] is a ClockPolicy, or the time shift from UTC in seconds
+    # (either one number or one number for each day).
+    # data is in UTC, the policies are applied on the fly.
+    # Returns arrays of shape (windows, clocks, days).
+    #
+    # The windows may be of any length; the part of a window after midnight
+    # (stop_time > 24*60*60) is counted with the data of the next day.
+
+    seconds_in_day = 24*60*60
+
+    start_times = np.asarray( start_times, dtype=float ).reshape(-1,1,1)
+    stop_times = np.asarray( stop_times, dtype=float ).reshape(-1,1,1)
+
+    sunrise = np.asarray( data['sunrise'], dtype=float )
+    sunset = np.asarray( data['sunset'], dtype=float )
+    twibegin = np.asarray( data['twilight_begin'], dtype=float )
+    twiend = np.asarray( data['twilight_end'], dtype=float )
+
+    number_of_days = len(sunrise)
+    number_of_windows = len(start_times)
+    number_of_clocks = len(policies)
+
+    # Very negative values indicate that the sun does not set
+    sunset = np.where( sunset < -seconds_in_day, np.inf, sunset )
+
+    # Very negative values indicate that the twilight does not end,
+    # it then lasts until the end of the window
+    twilight_does_not_end = twiend < -seconds_in_day
+
+    # The events in each clock, shape (clocks, days)
+    offsets = np.array( [ np.broadcast_to( policy_offsets( policy, number_of_days ), number_of_days )
+                          for policy in policies ], dtype=float )
+    sunrise = sunrise + offsets
+    sunset = sunset + offsets
+    twibegin = twibegin + offsets
+    twiend = twiend + offsets
+
+    shape = ( number_of_windows, number_of_clocks, number_of_days )
+    sunlight = np.zeros( shape )
+    twilight = np.zeros( shape )
+    days = np.arange( number_of_days )
+
+    # Work arrays, reused for every part of the windows
+    day_events = np.empty( (3, number_of_clocks, number_of_days) )
+    day_sunrise, day_sunset, day_twibegin = day_events
+    work = np.empty( (7,) + shape )
+    day_twiend, last_sunset, last_twiend, sunrise_t, sunset_t, twibegin_t, twiend_t = work
+
+    # Treat the windows in parts of at most one day,
+    # the k-th part after midnight uses the data of the k-th next day.
+    # Parts outside a window have t0 == t1 and add nothing.
+    first_day = int( start_times.min() // seconds_in_day )
+    last_day = int( -(-stop_times.max() // seconds_in_day) )
+
+    for k in range( first_day, last_day ):
+        t0 = np.clip( start_times - k*seconds_in_day, 0, seconds_in_day )
+        t1 = np.clip( stop_times - k*seconds_in_day, 0, seconds_in_day )
+
+        # The last days (first days) have no next (previous) day
+        # and use their own data.
+        rows = np.clip( days + k, 0, number_of_days-1 )
+
+        np.take( sunrise, rows, axis=1, out=day_sunrise )
+        np.take( sunset, rows, axis=1, out=day_sunset )
+        np.take( twibegin, rows, axis=1, out=day_twibegin )
+        np.copyto( day_twiend, np.take( twiend, rows, axis=1 ) )
+        np.copyto( day_twiend, t1, where=twilight_does_not_end[rows] )
+
+        np.clip( day_sunrise, t0, t1, out=sunrise_t )
+        np.clip( day_sunset, t0, t1, out=sunset_t )
+
+        # If yesterday's sun has not set
+        np.subtract( day_sunset, seconds_in_day, out=last_sunset )
+        np.clip( last_sunset, t0, sunrise_t, out=last_sunset )
+        np.subtract( day_twiend, seconds_in_day, out=last_twiend )
+        np.clip( last_twiend, last_sunset, t1, out=last_twiend )
+
+        np.clip( day_twibegin, last_twiend, t1, out=twibegin_t )
+        np.clip( day_twiend, t0, t1, out=twiend_t )
+
+        # sunlight: t0 - last_sunset, sunrise - sunset
+        sunlight += last_sunset
+        sunlight -= t0
+        sunlight += sunset_t
+        sunlight -= sunrise_t
+
+        # twilight: last_sunset - last_twiend, twibegin - sunrise, sunset - twiend
+        twilight += last_twiend
+        twilight -= last_sunset
+        twilight += sunrise_t
+        twilight -= twibegin_t
+        twilight += twiend_t
+        twilight -= sunset_t
+
+    return sunlight, twilight
+
+
+def daylight_by_day( data, start_time=0, stop_time=24*60*60, policy=UTC ):
+    # Seconds of sunlight and twilight of each day between
+    # start_time and stop_time (seconds from midnight, 0 <= start_time < stop_time).
+    sunlight, twilight = daylight_sweep_by_day( data, [start_time], [stop_time], [policy] )
+    return sunlight[0,0], twilight[0,0]
+
+
+def year_of_day( dates, day ):
+    return int( np.asarray( dates )[day:day+1].astype('datetime64[Y]').astype(np.int64)[0] ) + 1970
+
+
+def sum_by_year_month( values, codes, number_of_years ):
+    # Sum of values (over the last axis) over the days of each year and month
+    # (codes from year_month_codes), in one bincount: shape (..., years, 12).
+    sums = reduce_bins( values, codes, number_of_years*12 )
+    return sums.reshape( sums.shape[:-1] + (number_of_years, 12) )
+
+
+def mean_by_year_month( values, codes, number_of_years ):
+    # Months without days are NaN
+    means = reduce_bins( values, codes, number_of_years*12, mean=True )
+    return means.reshape( means.shape[:-1] + (number_of_years, 12) )
+
+
+@timed
+def average_daylight_by_year_month( data, start_time=0, stop_time=24*60*60, policy=UTC ):
+    # average_daylight_by_month over any range of days:
+    # the years of the days, and the average hours of sunlight
+    # and twilight in each month of each year, shape (years, 12).
+
+    sunlight, twilight = daylight_by_day( data, start_time, stop_time, policy )
+
+    codes, years = year_month_codes( data['date'] )
+
+    sunlight_hours = mean_by_year_month( sunlight, codes, len(years) )/3600
+    twilight_hours = mean_by_year_month( twilight, codes, len(years) )/3600
+
+    return years, sunlight_hours, twilight_hours
+
+
+@timed
+def average_daylight_by_month( data, start_time=0, stop_time=24*60*60, policy=UTC ):
+    # 0 <= start_time, sleep_time in seconds from midnight
+    # in the time of the clock policy.
+    # Averages in the year of a day in the middle, in case
+    # the border days are from the adjacent years.
+
+    years, sunlight_hours, twilight_hours = average_daylight_by_year_month( data, start_time, stop_time, policy )
+
+    row = year_of_day( data['date'], len( data['date'] )//2 ) - years[0]
+
+    return sunlight_hours[row], twilight_hours[row]
+
+
+@timed
+def average_daylight_sweep( data, start_times, stop_times, policies=(UTC,) ):
+    # average_daylight_by_month for many windows and clocks at once
+    # (see daylight_sweep_by_day), shape (windows, clocks, months).
+
+    years, sunlight_hours, twilight_hours = average_daylight_sweep_by_year_month( data, start_times, stop_times, policies )
+
+    # The year of a day in the middle, as in average_daylight_by_month
+    row = year_of_day( data['date'], len( data['date'] )//2 ) - years[0]
+
+    return sunlight_hours[...,row,:], twilight_hours[...,row,:]
+
+
+@timed
+def average_daylight_sweep_by_year_month( data, start_times, stop_times, policies=(UTC,) ):
+    # average_daylight_sweep over any range of days: the years of the days,
+    # and the averages of shape (windows, clocks, years, 12).
+
+    sunlight, twilight = daylight_sweep_by_day( data, start_times, stop_times, policies )
+
+    codes, years = year_month_codes( data['date'] )
+
+    sunlight_hours = mean_by_year_month( sunlight, codes, len(years) )/3600
+    twilight_hours = mean_by_year_month( twilight, codes, len(years) )/3600
+
+    return years, sunlight_hours, twilight_hours
+
+
+@timed
+def average_daylight_sweep_by_bin( data, bins, start_times, stop_times, policies=(UTC,), mask=None ):
+    # average_daylight_sweep in any bins of days (labels, names) from day_bins.py,
+    # e.g. ISO weeks or seasons, counting only the days in mask (e.g. workdays):
+    # shape (windows, clocks, bins).
+
+    sunlight, twilight = daylight_sweep_by_day( data, start_times, stop_times, policies )
+
+    labels, names = bins
+
+    sunlight_hours = reduce_bins( sunlight, labels, len(names), mask, mean=True )/3600
+    twilight_hours = reduce_bins( twilight, labels, len(names), mask, mean=True )/3600
+
+    return sunlight_hours, twilight_hours
+
+
+def window_seconds( wake_time, sleep_time ):
+    wake_seconds = wake_time.second+60*wake_time.minute+3600*wake_time.hour
+    sleep_seconds = sleep_time.second+60*sleep_time.minute+3600*sleep_time.hour
+    if sleep_seconds <= wake_seconds:
+        # Going to sleep after midnight
+        sleep_seconds += 24*60*60
+    return wake_seconds, sleep_seconds
+
+
+def sunny_mornings_by_day( data, wake_time, policy=UTC ):
+    # Is it sunny, or twilight, at wake_time (seconds, in the time
+    # of the clock policy) on each day?
+
+    seconds_in_day = 24*60*60
+    number_of_days = len( data['date'] )
+    offsets = policy_offsets( policy, number_of_days )
+
+    twibegin = np.asarray( data['twilight_begin'], dtype=float )
+    sunrise = np.asarray( data['sunrise'], dtype=float )
+    sunset = np.asarray( data['sunset'], dtype=float )
+    twiend = np.asarray( data['twilight_end'], dtype=float )
+
+    sun_does_not_set = sunset < -seconds_in_day
+    twilight_does_not_end = twiend < -seconds_in_day
+
+    # Has it already happened at wake_time (UTC)?
+    utc_wake_time = wake_time - offsets
+
+    sunny = (utc_wake_time >= sunrise) & ~( (utc_wake_time >= sunset) & ~sun_does_not_set )
+
+    twilight = (utc_wake_time >= twibegin) \
+                & ~( (utc_wake_time >= twiend) & ~twilight_does_not_end ) \
+                & ~sunny
+
+    return sunny, twilight
+
+
+@timed
+def sunny_mornings_by_year_month( data, wake_time, policy=UTC ):
+    # sunny_mornings_by_month over any range of days: the years of the days,
+    # and the number of sunny and twilight mornings in each month of each year,
+    # shape (years, 12).
+
+    sunny, twilight = sunny_mornings_by_day( data, wake_time, policy )
+
+    codes, years = year_month_codes( data['date'] )
+
+    return years, sum_by_year_month( sunny, codes, len(years) ), sum_by_year_month( twilight, codes, len(years) )
+
+
+@timed
+def sunny_mornings_by_bin( data, bins, wake_time, policy=UTC, mask=None ):
+    # sunny_mornings_by_month in any bins of days (labels, names) from day_bins.py,
+    # counting only the days in mask (e.g. workdays)
+
+    sunny, twilight = sunny_mornings_by_day( data, wake_time, policy )
+
+    labels, names = bins
+
+    return reduce_bins( sunny, labels, len(names), mask ), reduce_bins( twilight, labels, len(names), mask )
+
+
+@timed
+def sunny_mornings_by_month( data, wake_time, policy=UTC ):
+    # wake_time in seconds, in the time of the clock policy.
+    # Mornings in the year of the first day.
+
+    years, sunny_mornings, twilight_mornings = sunny_mornings_by_year_month( data, wake_time, policy )
+
+    return sunny_mornings[0], twilight_mornings[0]
+
+
+def _count_table( begin, end, months, slots, step ):
+    # Number of days of each month (columns) with begin <= wake time < end,
+    # for the wake times 0, step, 2*step, ... (rows).
+    # The wake times of a day are the slots ceil(begin/step) up to ceil(end/step),
+    # so each day adds +1 and -1 to a difference table, summed up over the slots.
+    first = np.clip( np.ceil( begin/step ), 0, slots ).astype(int)
+    last = np.clip( np.ceil( end/step ), 0, slots ).astype(int)
+
+    counted = (last > first) & (months >= 0) & (months < 12)
+    first, last, months = first[counted], last[counted], months[counted]
+
+    size = (slots+1)*12
+    difference = np.bincount( first*12 + months, minlength=size ) - np.bincount( last*12 + months, minlength=size )
+    return np.cumsum( difference.reshape(( slots+1, 12 )), axis=0 )[:-1]
+
+
+@timed
+def sunny_mornings_table( data, policy=UTC, step=60 ):
+    # sunny_mornings_by_month for every wake time 0, step, 2*step, ...
+    # in the day (step in seconds, dividing the day) at once:
+    # row j of the tables is sunny_mornings_by_month at wake_time j*step.
+
+    seconds_in_day = 24*60*60
+    number_of_days = len( data['date'] )
+    offsets = policy_offsets( policy, number_of_days )
+
+    # Sunlight and twilight from begin up to (not including) end, in the time of the policy
+    sunrise = np.asarray( data['sunrise'], dtype=float ) + offsets
+    sunset = np.asarray( data['sunset'], dtype=float )
+    sunset = np.where( sunset < -seconds_in_day, np.inf, sunset + offsets )
+
+    twibegin = np.asarray( data['twilight_begin'], dtype=float ) + offsets
+    twiend = np.asarray( data['twilight_end'], dtype=float )
+    twiend = np.where( twiend < -seconds_in_day, np.inf, twiend + offsets )
+
+    # Months of the first year are 0-11, the days of later years are left out
+    months, _ = year_month_codes( data['date'] )
+
+    slots = seconds_in_day // step
+    sunny_mornings = _count_table( sunrise, sunset, months, slots, step )
+
+    # Twilight mornings are twilight but not sunny
+    twilight_mornings = _count_table( twibegin, twiend, months, slots, step ) \
+                        - _count_table( np.maximum( twibegin, sunrise ), np.minimum( twiend, sunset ), months, slots, step )
+
+    return sunny_mornings, twilight_mornings
+
+
+def table_mornings( tables, wake_time ):
+    # sunny_mornings_by_month at wake_time (seconds) from sunny_mornings_table
+    sunny_mornings, twilight_mornings = tables
+    step = 24*60*60 // len( sunny_mornings )
+    return sunny_mornings[ wake_time // step ], twilight_mornings[ wake_time // step ]
+
+
+def weave_thread( intervals, length ):
+    # Paint the intervals [t1, t2) of each code (in increasing order,
+    # later codes over earlier ones) on a thread of zeros, as uint8:
+    # each run of carpet_rle.light_runs is repeated over its minutes.
+    positions, thread_codes = light_runs( intervals, length )
+    run_lengths = np.diff( np.append( positions, length ) )
+    return np.repeat( thread_codes, run_lengths )
+
+
+@timed
+def weave_carpet( data ):
+    # The sun graph of the data (UTC): codes of shape (minutes in day, days)
+
+    # Resolution in minutes
+    minutes_in_day = 60*24
+    days_in_year = len( data['date'] )
+    length = days_in_year * minutes_in_day
+
+    def minutes( name ):
+        return np.round( np.asarray( data[name], dtype=float )/60 ).astype(np.int64)
+
+    twi_begin = minutes( 'twilight_begin' )
+    sunrise = minutes( 'sunrise' )
+    sunset = minutes( 'sunset' )
+    twi_end = minutes( 'twilight_end' )
+
+    # Paint twilight (TWI_CODE) and sunlight (DAY_CODE) over the night (NIGHT_CODE),
+    # the codes of carpet_rle
+    thread = weave_thread( [ light_intervals( twi_begin, twi_end, minutes_in_day ),
+                             light_intervals( sunrise, sunset, minutes_in_day ) ], length )
+
+    carpet = thread.reshape(( days_in_year, minutes_in_day )).T
+    return carpet
+
+
+def local_carpet( utc_carpet, policy ):
+    # The carpet in the time of the clock policy:
+    # minute m of day d is minute m - offset[d] of the UTC thread
+    # (wrapping around the ends).
+
+    minutes_in_day, number_of_days = utc_carpet.shape
+    thread = utc_carpet.ravel( order='F' )
+
+    offsets = policy.minute_offsets( number_of_days )
+    index = np.arange( thread.size ) - np.repeat( offsets, minutes_in_day )
+
+    return np.take( thread, index, mode='wrap' ).reshape( utc_carpet.shape, order='F' )
+
+
+def carpet_pieces( utc_carpet, policy ):
+    # The carpet in the time of the clock policy, as a list of
+    # (first day, part of the carpet) without copying the UTC carpet:
+    # on consecutive days with the same offset, minute m of day d is
+    # minute m - offset of the UTC thread, so those days are one view
+    # into the thread. Only a day that reaches past either end
+    # of the thread is copied (wrapping around, as in local_carpet).
+
+    minutes_in_day, number_of_days = utc_carpet.shape
+    thread = utc_carpet.ravel( order='F' )
+
+    offsets = policy.minute_offsets( number_of_days )
+
+    pieces = []
+    breaks = np.flatnonzero( np.diff(offsets) ) + 1
+    for day1, day2 in zip( np.append(0, breaks), np.append(breaks, number_of_days) ):
+        offset = offsets[day1]
+
+        # Days [first, last) are inside the thread
+        first = min( max( day1, -(-offset // minutes_in_day) ), day2 )
+        last = max( min( day2, (thread.size + offset) // minutes_in_day ), first )
+
+        for wrap_day in list( range(day1, first) ) + list( range(last, day2) ):
+            index = wrap_day*minutes_in_day - offset + np.arange( minutes_in_day )
+            pieces.append( ( wrap_day, np.take( thread, index, mode='wrap' )[:,None] ) )
+
+        if last > first:
+            part = thread[ first*minutes_in_day - offset : last*minutes_in_day - offset ]
+            pieces.append( ( first, part.reshape(( last-first, minutes_in_day )).T ) )
+
+    pieces.sort( key=lambda piece: piece[0] )
+    return pieces
@@ -0,0 +1,116 @@
+
+# Summed-area index of a sunshine carpet.
+
+# For each light class (twilight, sunlight) the index keeps the number of
+# minutes of that class in the carpet below and to the left of every
+# (minute, day) corner, so the minutes of the class in any rectangle
+# (minutes of the day x days) are four lookups, whatever its size.
+# A query window in the time of a clock policy is a rectangle in the
+# UTC carpet, moved by the offset; if it then crosses midnight it is
+# split into two rectangles (on consecutive days), and a range of days
+# going past the end of the year (e.g. Nov 1 to Feb 15) is split in two as well.
+#
+# Example:
+# index = DaylightIndex.from_data( utc_data )
+# daylight, twilight = index.query( 7*60, 9*60+30, first_day, last_day, offset=-60 )
+
+import numpy as np
+
+from clock_policy import UTC
+from daylight_core import weave_carpet
+from carpet_rle import TWI_CODE, DAY_CODE
+
+
+minutes_in_day = 24*60
+
+
+class DaylightIndex:
+
+    def __init__( self, carpet, dates=None ):
+        # carpet: codes of shape (minutes in day, days) from weave_carpet (UTC),
+        # dates: the date of each day (optional, for day_index)
+        self.minutes_in_day, self.number_of_days = carpet.shape
+        if dates is not None:
+            dates = np.asarray( dates, dtype='datetime64[D]' )
+        self.dates = dates
+
+        # tables[c, m, d]: minutes of class c before minute m on the days before d
+        self.tables = np.zeros( (2, self.minutes_in_day+1, self.number_of_days+1), dtype=np.int32 )
+        for table, code in zip( self.tables, [DAY_CODE, TWI_CODE] ):
+            np.cumsum( carpet == code, axis=0, out=table[1:,1:] )
+            np.cumsum( table[1:,1:], axis=1, out=table[1:,1:] )
+
+    @classmethod
+    def from_data( cls, data ):
+        return cls( weave_carpet( data ), data['date'] )
+
+    @property
+    def nbytes( self ):
+        return self.tables.nbytes
+
+    def day_index( self, dates ):
+        # Index of the days of dates in the carpet
+        return np.searchsorted( self.dates, np.asarray( dates, dtype='datetime64[D]' ) )
+
+    def _rectangles( self, minute1, minute2, day1, day2 ):
+        # Minutes of each class in the rectangles [minute1, minute2) x [day1, day2),
+        # clipped to the carpet
+        minute1 = np.clip( minute1, 0, self.minutes_in_day )
+        minute2 = np.clip( minute2, minute1, self.minutes_in_day )
+        day1 = np.clip( day1, 0, self.number_of_days )
+        day2 = np.clip( day2, day1, self.number_of_days )
+
+        tables = self.tables
+        return tables[:, minute2, day2] - tables[:, minute1, day2] - tables[:, minute2, day1] + tables[:, minute1, day1]
+
+    def _window( self, start, stop, day1, day2 ):
+        # Minutes of each class between start and stop (minutes from the UTC midnight
+        # of each day, start < stop <= start + minutes in day) on the days [day1, day2)
+        shift = start // self.minutes_in_day
+        start = start - shift*self.minutes_in_day
+        stop = stop - shift*self.minutes_in_day
+
+        # Up to midnight, then on the next days
+        return self._rectangles( start, stop, day1+shift, day2+shift ) \
+               + self._rectangles( 0, stop-self.minutes_in_day, day1+shift+1, day2+shift+1 )
+
+    def query( self, start, stop, first_day, last_day, offset=0 ):
+        # Minutes of sunlight and twilight between start and stop (minutes from
+        # midnight in a clock offset minutes from UTC; stop <= start is after midnight)
+        # on the days first_day up to (not including) last_day.
+        # last_day <= first_day goes past the last day to the first ones.
+        # All arguments may be arrays (of the same shape) for many queries at once.
+        # Days outside the carpet count as nothing.
+        start, stop, first_day, last_day, offset = np.broadcast_arrays(
+            *[ np.asarray( value, dtype=np.int64 ) for value in (start, stop, first_day, last_day, offset) ] )
+
+        stop = np.where( stop <= start, stop + self.minutes_in_day, stop )
+        start, stop = start - offset, stop - offset
+
+        wraps = last_day <= first_day
+        minutes = self._window( start, stop, first_day, np.where( wraps, self.number_of_days, last_day ) ) \
+                  + self._window( start, stop, 0, np.where( wraps, last_day, 0 ) )
+
+        return minutes[0], minutes[1]
+
+    def policy_query( self, start, stop, first_day, last_day, policy=UTC ):
+        # query in the time of a clock policy: the days are split
+        # where its offset changes, and the parts added up.
+        offsets = policy.minute_offsets( self.number_of_days )
+        breaks = np.append( np.flatnonzero( np.diff(offsets) ) + 1, self.number_of_days )
+
+        daylight, twilight = 0, 0
+        day1 = 0
+        for day2 in breaks:
+            # The part of [first_day, last_day) in [day1, day2)
+            if last_day > first_day:
+                parts = [ (max(first_day, day1), min(last_day, day2)) ]
+            else:
+                parts = [ (max(first_day, day1), day2), (day1, min(last_day, day2)) ]
+            for part1, part2 in parts:
+                if part2 > part1:
+                    part_daylight, part_twilight = self.query( start, stop, part1, part2, offsets[day1] )
+                    daylight, twilight = daylight + part_daylight, twilight + part_twilight
+            day1 = day2
+
+        return daylight, twilight
@@ -0,0 +1,105 @@
+
+# Daylight statistics from the command line, without plotting.
+
+# Prints the hours of sunlight and twilight between the wake and sleep times
+# over the year (and optionally in each month), and the number of sunny
+# mornings at the wake time, in UTC, local time and local time + DST.
+# Only numpy and the kernels of daylight_core.py are imported (not matplotlib,
+# nor pandas when the data is in the store), so it answers in a fraction of a second.
+#
+# Usage:
+# python3 daylight_stats.py RVK 2018
+# python3 daylight_stats.py RVK 2018 --wake 7:00 --sleep 23:00 --offset -1 --dst-zone Europe/London --months --mornings
+# python3 daylight_stats.py RVK 2018 --bins week --workdays --holidays holidays.txt --mornings
+
+import argparse
+from datetime import datetime
+
+from sun_store import load_columns, STORE_PATH
+from clock_policy import ClockPolicy, UTC
+from daylight_core import daylight_sweep_by_day, average_daylight_sweep, sunny_mornings_by_month, window_seconds, \
+                          average_daylight_sweep_by_bin, sunny_mornings_by_bin
+from day_bins import month_bins, iso_week_bins, season_bins, workday_mask, read_holidays
+
+
+month_names = [r'jan', r'feb', r'mar', r'apr', r'maí', r'jún', r'júl', r'ágú', r'sep', r'okt', r'nóv', r'des']
+clock_names = [ 'UTC', 'Local', 'DST' ]
+bin_functions = { 'month': month_bins, 'week': iso_week_bins, 'season': season_bins }
+
+
+def parse_time( text ):
+    return datetime.strptime( text, '%H:%M' ).time()
+
+
+def main( argv=None ):
+    parser = argparse.ArgumentParser( description='Daylight during waking hours in UTC, local time and local time + DST.' )
+    parser.add_argument( 'loc', help='location, e.g. RVK' )
+    parser.add_argument( 'year', type=int )
+    parser.add_argument( '--wake', type=parse_time, default=parse_time('7:00'), help='wake time, HH:MM' )
+    parser.add_argument( '--sleep', type=parse_time, default=parse_time('23:00'), help='sleep time, HH:MM' )
+    parser.add_argument( '--offset', type=float, default=-1, help='offset in hours from UTC in winter' )
+    parser.add_argument( '--dst-zone', default='Europe/London', help='DST on the same days as in this time zone' )
+    parser.add_argument( '--months', action='store_true', help='also print the average of each month' )
+    parser.add_argument( '--mornings', action='store_true', help='also print the number of sunny mornings' )
+    parser.add_argument( '--bins', choices=sorted( bin_functions ), help='also print the averages (and the sunny mornings) in these bins' )
+    parser.add_argument( '--workdays', action='store_true', help='only the workdays (Monday to Friday) in the --bins tables' )
+    parser.add_argument( '--holidays', default=None, help='file of holidays (YYYY-MM-DD, one per line), not workdays' )
+    parser.add_argument( '--data', default=None, help="pickle to read if the store does not have the data (default '[LOC][YEAR].pkl')" )
+    parser.add_argument( '--store', default=STORE_PATH )
+    args = parser.parse_args( argv )
+
+    data = load_columns( args.loc, args.year, args.data, args.store )
+
+    shift = int( round( args.offset*60*60 ) )
+    policies = [ UTC, ClockPolicy( shift ), ClockPolicy.with_zone_dst( shift, data['date'], args.dst_zone ) ]
+
+    wake_seconds, sleep_seconds = window_seconds( args.wake, args.sleep )
+
+    sunlight, twilight = daylight_sweep_by_day( data, [wake_seconds], [sleep_seconds], policies )
+
+    print( '%s%d: %s - %s' % (args.loc, args.year, args.wake.strftime('%H:%M'), args.sleep.strftime('%H:%M')) )
+    print( '\tClock,\tSunlight,\tTwilight' )
+    for name, clock_sunlight, clock_twilight in zip( clock_names, sunlight[0], twilight[0] ):
+        print( '\t%s,\t%.2f,\t%.2f' % (name, clock_sunlight.sum()/3600, clock_twilight.sum()/3600) )
+
+    if args.months:
+        sunlight_hours, twilight_hours = average_daylight_sweep( data, [wake_seconds], [sleep_seconds], policies )
+        print( '\nAverage hours of sunlight + twilight:' )
+        print( '\tClock,\t' + ',\t'.join( month_names ) )
+        for name, clock_sunlight, clock_twilight in zip( clock_names, sunlight_hours[0], twilight_hours[0] ):
+            print( '\t%s,\t' % name + ',\t'.join( '%.1f' % hours for hours in clock_sunlight + clock_twilight ) )
+
+    if args.mornings:
+        print( '\nSunny mornings at %s:' % args.wake.strftime('%H:%M') )
+        print( '\tClock,\tSunlight,\tTwilight' )
+        for name, policy in zip( clock_names, policies ):
+            sunny, twilight_mornings = sunny_mornings_by_month( data, wake_seconds, policy )
+            print( '\t%s,\t%d,\t\t%d' % (name, sunny.sum(), twilight_mornings.sum()) )
+
+    if args.bins:
+        bins = bin_functions[ args.bins ]( data['date'] )
+        bin_names = bins[1]
+
+        mask = None
+        if args.workdays or args.holidays:
+            holidays = read_holidays( args.holidays ) if args.holidays else ()
+            mask = workday_mask( data['date'], holidays )
+        days = ' on workdays' if mask is not None else ''
+
+        sunlight_hours, twilight_hours = average_daylight_sweep_by_bin( data, bins, [wake_seconds], [sleep_seconds], policies, mask )
+        print( '\nAverage hours of sunlight + twilight%s:' % days )
+        print( '\tClock,\t' + ',\t'.join( bin_names ) )
+        for name, clock_sunlight, clock_twilight in zip( clock_names, sunlight_hours[0], twilight_hours[0] ):
+            print( '\t%s,\t' % name + ',\t'.join( '%.1f' % hours for hours in clock_sunlight + clock_twilight ) )
+
+        if args.mornings:
+            print( '\nSunny mornings at %s%s:' % (args.wake.strftime('%H:%M'), days) )
+            print( '\tClock,\tLight,\t\t' + ',\t'.join( bin_names ) )
+            for name, policy in zip( clock_names, policies ):
+                sunny, twilight_mornings = sunny_mornings_by_bin( data, bins, wake_seconds, policy, mask )
+                print( '\t%s,\tSunlight,\t' % name + ',\t'.join( '%d' % mornings for mornings in sunny ) )
+                print( '\t%s,\tTwilight,\t' % name + ',\t'.join( '%d' % mornings for mornings in twilight_mornings ) )
+
+
+if __name__ == '__main__':
+    main()
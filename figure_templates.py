@@ -0,0 +1,60 @@
+
+# Reusable figures for the bar plots.
+
+# Building a figure, its axes and bars takes about as long as saving it.
+# The bar plots of a sweep (many wake times, or many locations) all have the
+# same bars in the same places, so each kind of plot is built once and kept:
+# a new plot only sets the heights and bottoms of the bars (and the title
+# and axes), and is saved from the same figure.
+# The figures are matplotlib.figure.Figure, not pyplot figures,
+# so plt.close does not close them.
+
+import numpy as np
+from matplotlib.figure import Figure
+
+from instrument import stage
+
+
+class StackedBarTemplate:
+
+    def __init__( self, columns, edgecolor='#ffffff', figsize=(6,4) ):
+        # columns: (x positions, width, colors, labels) of each column of stacked bars,
+        # with one color and label (or None) for each layer, from the bottom.
+        # The bars are drawn in this order.
+        self.figure = Figure( figsize=figsize )
+        self.ax = self.figure.add_subplot(1,1,1)
+
+        self.columns = []
+        for positions, width, layer_colors, layer_labels in columns:
+            self.columns.append( [ self.ax.bar( positions, np.zeros( len(positions) ), width=width,
+                                                color=color, edgecolor=edgecolor, label=label )
+                                   for color, label in zip( layer_colors, layer_labels ) ] )
+
+    def update( self, heights ):
+        # heights[i][j]: the heights of layer j of column i
+        with stage( 'update_bars' ):
+            self._update( heights )
+
+    def _update( self, heights ):
+        for column, column_heights in zip( self.columns, heights ):
+            bottom = 0
+            for bars, layer_heights in zip( column, column_heights ):
+                bottoms = np.broadcast_to( bottom, len(bars) )
+                for bar, height, bar_bottom in zip( bars, layer_heights, bottoms ):
+                    bar.set_y( bar_bottom )
+                    bar.set_height( height )
+                bottom = bottom + np.asarray( layer_heights )
+
+    def save( self, path, dpi ):
+        with stage( 'savefig' ):
+            self.figure.savefig( path, dpi=dpi, bbox_inches='tight' )
+
+
+_templates = {}
+
+def cached_template( key, build_template ):
+    # The template for key, built by build_template() the first time
+    if key not in _templates:
+        with stage( 'build_bars' ):
+            _templates[key] = build_template()
+    return _templates[key]
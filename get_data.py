@@ -2,17 +2,22 @@
 # Fetch data from https://sunrise-sunset.org/
 
 # Saves a table of times of sunrise, sunset, noon,
-# and twilight beginnings and ends over one year.
+# and twilight beginnings and ends over one year
+# (or several years, see LAST_YEAR).
 # The table is organized in columns:
 # (date | twilight_begin | sunrise | noon | sunset | twilight_end)
 # The first column keeps datetime.date objects,
 # and the other columns keep the time of the repsective events
 # as the number of seconds from midnight (UTC) of the given date.
 
+import numpy as np
 import pandas as pd
-import urllib.request
-import json
-from datetime import datetime, timezone, timedelta
+from datetime import date, datetime, timezone
+
+import solar_ephemeris
+import sunrise_sunset_api
+import response_cache
+import sun_store
 
 def as_datetime( datestring ):
     iso_8601_format = '%Y-%m-%dT%H:%M:%S%z'
@@ -21,79 +26,99 @@ def as_datetime( datestring ):
     return utc_datetime
 
 
-def is_leap_year( year ):
-    last_day_of_february = (datetime(year,3,1) - timedelta(1)).day
-    return last_day_of_february == 29
-
-
-
 # -----------------------------------------
 # ----------- CONFIG ----------------------
 # -----------------------------------------
 
 YEAR = 2018
+# For several years in one table, e.g. LAST_YEAR = 2027
+LAST_YEAR = YEAR
+
+# 'ephemeris' computes the data offline (see solar_ephemeris.py),
+# 'api' downloads it from https://sunrise-sunset.org/
+SOURCE = 'ephemeris'
+
+# Options for SOURCE = 'api'
+API_URL = sunrise_sunset_api.API_URL
+# Number of simultaneous requests
+CONCURRENCY = 8
+# Requests per second, None for no limit
+RATE_LIMIT = 20
+# Downloaded days are kept here, and not downloaded again
+# (None for no cache)
+CACHE_DIR = response_cache.CACHE_DIR
+CACHE_MAX_BYTES = response_cache.CACHE_MAX_BYTES
 
 # Reykjavik
 PLACE_NAME = 'RVK'
 LAT = 64.13
 LNG = -21.82
-TZ = timezone(timedelta(0))# not used
+TIME_ZONE = 'Atlantic/Reykjavik'
 
 
 # # Lisbon
 # PLACE_NAME = 'LIS'
 # LAT = 38.72
 # LNG = -9.14
-# TZ = timezone(timedelta(0))# not used
+# TIME_ZONE = 'Europe/Lisbon'
 
 
 # # Ponta Delgada
 # PLACE_NAME = 'PDL'
 # LAT = 37.74
 # LNG = -25.68
-# TZ = timezone(timedelta(hours=-1))# not used
+# TIME_ZONE = 'Atlantic/Azores'
 
 # # Praia
 # PLACE_NAME = 'PRA'
 # LAT = 14.933
 # LNG = -23.513
-# TZ = timezone(timedelta(hours=-1))# not used
+# TIME_ZONE = 'Atlantic/Cape_Verde'
 
 # # Husavik
 # PLACE_NAME = 'HVK'
 # LAT = 66.05
 # LNG = -17.34
-# TZ = timezone(timedelta(0))# not used
+# TIME_ZONE = 'Atlantic/Reykjavik'
 
 
 # # Tromso
 # PLACE_NAME = 'TOS'
 # LAT = 69.65
 # LNG = 18.96
-# TZ = timezone(timedelta(hours=1))# not used
+# TIME_ZONE = 'Europe/Oslo'
 
 # # Zurich
 # PLACE_NAME = 'ZRH'
 # LAT = 47.38
 # LNG = 8.54
-# TZ = timezone(timedelta(hours=1)) # not used
+# TIME_ZONE = 'Europe/Zurich'
 
 
 # # Moscow
 # PLACE_NAME = 'MSK'
 # LAT = 55.76
 # LNG = 37.62
-# TZ = timezone(timedelta(hours=3))# not used
+# TIME_ZONE = 'Europe/Moscow'
 
 # # Santiago, Chile
 # PLACE_NAME = 'SCL'
 # LAT = -33.45
 # LNG = -70.67
-# TZ = timezone(timedelta(hours=-5))# not used
+# TIME_ZONE = 'America/Santiago'
+
 
 
+# Also add the data to the columnar store (see sun_store.py),
+# None to only save FILE_NAME
+STORE_PATH = None
 
-FILE_NAME = PLACE_NAME+str(YEAR)+'.pkl'
+if LAST_YEAR == YEAR:
+    YEARS = str(YEAR)
+else:
+    YEARS = '%d-%d' % (YEAR,LAST_YEAR)
+
+FILE_NAME = PLACE_NAME+YEARS+'.pkl'
 
 
 # -----------------------------------------
@@ -101,42 +126,62 @@ FILE_NAME = PLACE_NAME+str(YEAR)+'.pkl'
 # -----------------------------------------
 
 
-# First entry for convenient indexing.
-months = ['', 'Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Okt', 'Nov', 'Dec']
-month_days = [0,31,28+is_leap_year(YEAR),31,30,31,30,31,31,30,31,30,31]
+# API field for each column of the table
+api_fields = [ 'civil_twilight_begin', 'sunrise', 'solar_noon', 'sunset', 'civil_twilight_end' ]
+col_names = [ 'date', 'twilight_begin', 'sunrise', 'noon', 'sunset', 'twilight_end' ]
 
 
-data_table = pd.DataFrame()
+def build_table( days, all_data ):
+    # Fill one preallocated array per column and make the table once.
 
-print('Downloading data for %s (%.1f, %.1f) for %d' % (PLACE_NAME,LAT,LNG,YEAR))
-for month in range(1,13):
-    
+    number_of_days = len(days)
+    columns = { name: np.empty( number_of_days ) for name in col_names[1:] }
 
-    print( '\n\t' + months[month], end = '', flush = True )
-    for day in range(1,1+month_days[month]):
-        
-        print( '.', end = '', flush = True )
-        
-        date_url = 'https://api.sunrise-sunset.org/json?lat=%f&lng=%f&date=%d-%d-%d&formatted=0' % (LAT,LNG,YEAR,month,day)
-        with urllib.request.urlopen(date_url) as response:
-            date_data = json.load(response)['results']
-        
-        ref = datetime( YEAR, month, day, 0, 0 ,0, 0, timezone.utc )
+    for ind, (day, date_data) in enumerate(zip(days, all_data)):
 
-        date = ref.date()
-        twilight_begin = ( as_datetime( date_data['civil_twilight_begin'] ) - ref ).total_seconds()
-        sunrise = ( as_datetime( date_data['sunrise'] ) - ref ).total_seconds()
-        noon = ( as_datetime( date_data['solar_noon'] ) - ref ).total_seconds()
-        sunset = ( as_datetime( date_data['sunset'] ) - ref ).total_seconds()
-        twilight_end = ( as_datetime( date_data['civil_twilight_end'] ) - ref ).total_seconds()
-        
-        table_row = [[ date, twilight_begin, sunrise, noon, sunset, twilight_end ]]
-        
-        data_table = data_table.append( table_row, ignore_index = True )
+        ref = datetime( day.year, day.month, day.day, 0, 0 ,0, 0, timezone.utc )
 
-col_names = [ 'date', 'twilight_begin', 'sunrise', 'noon', 'sunset', 'twilight_end' ]
-data_table.rename(columns = dict(zip(data_table.columns, col_names)), inplace = True)
+        for name, field in zip(col_names[1:], api_fields):
+            columns[name][ind] = ( as_datetime( date_data[field] ) - ref ).total_seconds()
+
+    data_table = pd.DataFrame( { 'date': np.array( days, dtype=object ) } )
+    for name in col_names[1:]:
+        data_table[name] = columns[name]
+
+    return data_table
+
+
+def download_table( lat, lng, start_date, end_date ):
+    # Data for the days from start_date to end_date (inclusive)
+
+    days = list( solar_ephemeris.date_range( start_date, end_date ).astype(object) )
+
+    cache = None
+    if CACHE_DIR is not None:
+        cache = response_cache.ResponseCache( CACHE_DIR, CACHE_MAX_BYTES )
+
+    # Concurrent requests over keep-alive connections
+    fetcher = sunrise_sunset_api.ApiFetcher( API_URL, CONCURRENCY, RATE_LIMIT, cache=cache )
+    all_data = fetcher.fetch_days( lat, lng, days, progress=True )
+
+    return build_table( days, all_data )
+
+
+if __name__ == '__main__':
+
+    start_date = date(YEAR,1,1)
+    end_date = date(LAST_YEAR,12,31)
+
+    if SOURCE == 'api':
+        print('Downloading data for %s (%.1f, %.1f) for %s' % (PLACE_NAME,LAT,LNG,YEARS))
+        data_table = download_table( LAT, LNG, start_date, end_date )
+    else:
+        print('Computing data for %s (%.1f, %.1f) for %s' % (PLACE_NAME,LAT,LNG,YEARS))
+        data_table = solar_ephemeris.sun_table( LAT, LNG, start_date, end_date )
 
-print( '\nSaving to %s...' % FILE_NAME )
-data_table.to_pickle(FILE_NAME)
+    print( '\nSaving to %s...' % FILE_NAME )
+    data_table.to_pickle(FILE_NAME)
 
+    if STORE_PATH is not None:
+        print( 'Adding to %s...' % STORE_PATH )
+        sun_store.SunStore( STORE_PATH ).add( PLACE_NAME, data_table, LAT, LNG, TIME_ZONE )
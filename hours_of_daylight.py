@@ -1,11 +1,14 @@
 
 import sys
 
-import pandas as pd
 import matplotlib.pyplot as plt
-import matplotlib.ticker as ticker
 import numpy as np
-from datetime import date, time, timedelta
+from datetime import time
+
+from sun_store import load_table
+from clock_policy import ClockPolicy, UTC
+from figure_templates import StackedBarTemplate, cached_template
+from daylight_core import average_daylight_by_month, average_daylight_sweep, window_seconds
 
 
 # -----------------------------------------
@@ -22,15 +25,18 @@ LOCNAME = r' í Reykjavík'
 # LOCNAME = r' í Ponta Delgada'
 YEAR = 2018
 DATA_PATH = '%s%d.pkl' %(LOC,YEAR)
+# The data is read from the columnar store (see sun_store.py)
+# if it has LOC and YEAR, otherwise from DATA_PATH.
+STORE_PATH = 'sun_store'
 
 # Offset in hours from UTC in winter.
 UTC_OFFSET = -1
 
 
 
-# In 2018, DST starts on March 25 and ends October 28
-DST_START_DATE = date(YEAR,3,25)
-DST_END_DATE = date(YEAR,10,28)
+# DST on the same days as in this time zone
+# (in 2018, from March 25 to October 28)
+DST_ZONE = 'Europe/London'
 
 plt.rc('font', family='Times New Roman')
 DPI = 150
@@ -89,122 +95,45 @@ def compare_daylight_hours_plot_config( ax, hour_limit = 24 ):
 
 
 
-def average_daylight_by_month( data, start_time=0, stop_time=24*60*60 ):
-    # 0 <= start_time, sleep_time in seconds from midnight
-
-    dates = data['date']
-    seconds_in_day = 24*60*60
-
-    # Seperately treat the hours before and after midnight
-    if stop_time > seconds_in_day:
-
-        sunlight_hours, twilight_hours = average_daylight_by_month(data, start_time, seconds_in_day)
-
-        residual_time = stop_time - seconds_in_day
-
-        shifted_data = data.copy()
-        shifted_data['date'] = dates - timedelta(1)
-
-        res_sun, res_twi = average_daylight_by_month( shifted_data, 0, residual_time )
-
-        sunlight_hours += res_sun
-        twilight_hours += res_twi
-
-        return sunlight_hours, twilight_hours
-
-    sunrise = data['sunrise']
-    sunset = data['sunset'].copy()
-
-    twibegin = data['twilight_begin']
-    twiend = data['twilight_end'].copy()
-
-    # Very negative values indicate that the twilight does not end
-    twiend[ twiend<-seconds_in_day ] = stop_time
-
-    # Very negative values indicate that the sun does not set
-    sunset[ sunset<-seconds_in_day ] = np.inf
-
-    # # If yesterday's sun has not set
-    # last_sunset = np.roll( sunset, 1 ) - seconds_in_day
-    # last_twiend = np.roll( twiend, 1 ) - seconds_in_day
-
-    # Rolling seems to be unnecessary
-    last_sunset = sunset - seconds_in_day
-    last_twiend = twiend - seconds_in_day
-
-    sunrise = sunrise.clip( start_time, stop_time )
-    sunset = sunset.clip( start_time, stop_time )
-
-    last_sunset = last_sunset.clip( start_time, sunrise )
-    # last_sunset = last_sunset.clip( start_time, stop_time )
-    last_twiend = last_twiend.clip( last_sunset, stop_time )
-
-    twibegin = twibegin.clip( last_twiend, stop_time )
-
-    twiend = twiend.clip( start_time, stop_time )
-
-    # # To see if time series are correct
-    # plt.clf()
-    # plt.close()
-    # plt.plot(last_sunset)
-    # plt.plot(last_twiend)
-    # plt.plot(twibegin)
-    # plt.plot(sunrise)
-    # plt.plot(sunset)
-    # plt.plot(twiend)
-    # plt.show()
-
-    sunlight_0 = last_sunset - start_time
-    twilight_0 = last_twiend - last_sunset
-    twilight_1 = sunrise - twibegin
-    sunlight_1 = sunset - sunrise
-    twilight_2 = twiend - sunset
-
-    twilight = twilight_0 + twilight_1 + twilight_2
-    sunlight = sunlight_0 + sunlight_1
-
-
-    # Take the year of a day in the middle in case
-    # the border days are from the adjacent years.
-    middle_ind = len(dates) // 2
-    year = dates[middle_ind].year
-
+def daylight_template( plot_colors ):
+    # Bars of daylight and twilight in each month, built once (see figure_templates.py)
+    barwidth = 0.75
+    # twi_barcolor = '#106ebc'
+    # day_barcolor = '#c6e5ff'
 
-    first_day_of_months = [date(year,month,1) for month in range(1,13)]
-    month_indices = dates.searchsorted(first_day_of_months)
-    month_indices = np.append(month_indices, None) # convenience
-    
+    twi_barcolor = plot_colors[1]
+    day_barcolor = plot_colors[0]
 
-    sunlight_hours = np.zeros(12)
-    twilight_hours = np.zeros(12)
+    template = StackedBarTemplate( [ ( np.arange(12), barwidth, [day_barcolor, twi_barcolor], [None, None] ) ] )
+    template.ax.set_ylabel('klst.')
+    return template
 
-    for month in range(12):
-        month_start = month_indices[month]
-        month_end = month_indices[month+1]
 
-        # Average sunlight, converted to hours
-        sunlight_hours[month] = sunlight.iloc[month_start:month_end].mean()/3600
-        # Average twilight, converted to hours
-        twilight_hours[month] = twilight.iloc[month_start:month_end].mean()/3600
+def comparison_template( plot_colors ):
+    # Bars of daylight and twilight in each month in UTC, shift, DST
+    barwidth = 0.25
+    # twi_barcolor = '#5e5bff'
+    # day_barcolor = '#83c7ff'
 
+    twi_barcolor = plot_colors[1]
+    day_barcolor = plot_colors[0]
 
-    return sunlight_hours, twilight_hours
+    template = StackedBarTemplate( [ ( np.arange(12)+column*barwidth, barwidth, [day_barcolor, twi_barcolor], [None, None] )
+                                     for column in (-1, 0, 1) ] )
+    template.ax.set_ylabel('klst.')
+    return template
 
 
-def make_daylight_hours_plot( wake_time, sleep_time, loc_short, location_name, year, fig_dpi, plot_colors, data_table ):
+def make_daylight_hours_plot( wake_time, sleep_time, loc_short, location_name, year, fig_dpi, plot_colors, data_table, policy=UTC ):
     # -----------------------------------------
     # -------------- COUNT HOURS --------------
     # -----------------------------------------
 
 
-    wake_seconds = wake_time.second+60*wake_time.minute+3600*wake_time.hour
-    sleep_seconds = sleep_time.second+60*sleep_time.minute+3600*sleep_time.hour
-    if sleep_seconds <= wake_seconds:
-        # Going to sleep after midnight
-        sleep_seconds += 24*60*60
+    wake_seconds, sleep_seconds = window_seconds( wake_time, sleep_time )
 
 
-    Daylight, Twilight = average_daylight_by_month( data_table, wake_seconds, sleep_seconds )
+    Daylight, Twilight = average_daylight_by_month( data_table, wake_seconds, sleep_seconds, policy )
 
 
     # -----------------------------------------
@@ -212,31 +141,9 @@ def make_daylight_hours_plot( wake_time, sleep_time, loc_short, location_name, y
     # -----------------------------------------
 
 
-    barwidth = 0.75
-    # twi_barcolor = '#106ebc'
-    # day_barcolor = '#c6e5ff'
-
-    twi_barcolor = plot_colors[1]
-    day_barcolor = plot_colors[0]
-
-
-    baredge = '#ffffff'
-
-
-    fig = plt.figure(figsize=(6,4))
-    ax = fig.add_subplot(1,1,1)
-
-    ax.bar( range(12),
-            Daylight,
-            width=barwidth,
-            color=day_barcolor,
-            edgecolor=baredge)
-    ax.bar( range(12),
-            Twilight,
-            bottom=Daylight,
-            width=barwidth,
-            color=twi_barcolor,
-            edgecolor=baredge)
+    template = cached_template( ('daylight', tuple(plot_colors)), lambda: daylight_template( plot_colors ) )
+    template.update( [ [Daylight, Twilight] ] )
+    ax = template.ax
 
     awake_hours = (sleep_seconds - wake_seconds)/3600
     hours_daylight_hours_plot_config(ax, awake_hours)
@@ -249,31 +156,31 @@ def make_daylight_hours_plot( wake_time, sleep_time, loc_short, location_name, y
 
     ax.set_title(str1+str2)
 
-    ax.set_ylabel('klst.')
-
-    plt.savefig('%s%d-daylight.png'%(loc_short,year),dpi=fig_dpi,bbox_inches='tight')
+    template.save('%s%d-daylight.png'%(loc_short,year),fig_dpi)
     # plt.show()
 
 
 
-def make_daylight_hours_comparison_plot( wake_time, sleep_time, loc_short, location_name, year, fig_dpi, plot_colors, utc_data, shift_data, dst_data ):
+def make_daylight_hours_comparison_plot( wake_time, sleep_time, loc_short, location_name, year, fig_dpi, plot_colors, utc_data, policies, daylight=None ):
+    # policies: the clock policies UTC, shift, DST
+    # daylight: optionally the averages for this window from average_daylight_sweep,
+    # (sunlight, twilight) with rows UTC, shift, DST.
+
     # -----------------------------------------
     # -------------- COUNT HOURS --------------
     # -----------------------------------------
 
-    number_of_days = len(utc_data)
+    number_of_days = len(utc_data['date'])
     is_leap_year = (number_of_days == 366)
 
-    wake_seconds = wake_time.second+60*wake_time.minute+3600*wake_time.hour
-    sleep_seconds = sleep_time.second+60*sleep_time.minute+3600*sleep_time.hour
-    if sleep_seconds <= wake_seconds:
-        # Going to sleep after midnight
-        sleep_seconds += 24*60*60
+    wake_seconds, sleep_seconds = window_seconds( wake_time, sleep_time )
+
 
+    if daylight is None:
+        sunlight, twilight = average_daylight_sweep( utc_data, [wake_seconds], [sleep_seconds], policies )
+        daylight = (sunlight[0], twilight[0])
 
-    utcDaylight, utcTwilight = average_daylight_by_month( utc_data, wake_seconds, sleep_seconds )
-    shiftDaylight, shiftTwilight = average_daylight_by_month( shift_data, wake_seconds, sleep_seconds )
-    dstDaylight, dstTwilight = average_daylight_by_month( dst_data, wake_seconds, sleep_seconds )
+    (utcDaylight, shiftDaylight, dstDaylight), (utcTwilight, shiftTwilight, dstTwilight) = daylight
 
     # -----------------------------------------
     # ------------- PRINT TABLE ---------------
@@ -301,55 +208,11 @@ def make_daylight_hours_comparison_plot( wake_time, sleep_time, loc_short, locat
     # -------------- PLOT ---------------------
     # -----------------------------------------
 
-    barwidth = 0.25
-    # twi_barcolor = '#5e5bff'
-    # day_barcolor = '#83c7ff'
-
-    twi_barcolor = plot_colors[1]
-    day_barcolor = plot_colors[0]
-    baredge = '#ffffff'
-
-    fig = plt.figure(figsize=(6,4))
-    ax = fig.add_subplot(1,1,1)
-
-    ax.bar( np.arange(12)-barwidth,
-            utcDaylight,
-            width=barwidth,
-            color=day_barcolor,
-            edgecolor=baredge)
-    ax.bar( np.arange(12)-barwidth,
-            utcTwilight,
-            bottom=utcDaylight,
-            width=barwidth,
-            color=twi_barcolor,
-            edgecolor=baredge)
-
-
-    ax.bar( np.arange(12),
-            shiftDaylight,
-            width=barwidth,
-            color=day_barcolor,
-            edgecolor=baredge)
-    ax.bar( np.arange(12),
-            shiftTwilight,
-            bottom=shiftDaylight,
-            width=barwidth,
-            color=twi_barcolor,
-            edgecolor=baredge)
-
-
-
-    ax.bar( np.arange(12)+barwidth,
-            dstDaylight,
-            width=barwidth,
-            color=day_barcolor,
-            edgecolor=baredge)
-    ax.bar( np.arange(12)+barwidth,
-            dstTwilight,
-            bottom=dstDaylight,
-            width=barwidth,
-            color=twi_barcolor,
-            edgecolor=baredge)
+    template = cached_template( ('daylightcompare', tuple(plot_colors)), lambda: comparison_template( plot_colors ) )
+    template.update( [ [utcDaylight, utcTwilight],
+                       [shiftDaylight, shiftTwilight],
+                       [dstDaylight, dstTwilight] ] )
+    ax = template.ax
 
     awake_hours = (sleep_seconds - wake_seconds)/3600
 
@@ -362,11 +225,8 @@ def make_daylight_hours_comparison_plot( wake_time, sleep_time, loc_short, locat
 
     ax.set_title(str1+str2)
 
-
-    ax.set_ylabel('klst.')
-
     timestring = wake_time.strftime('%H%M') + '-' + sleep_time.strftime('%H%M')
-    plt.savefig('%s%d-daylightcompare-%s.png'%(loc_short,year,timestring),dpi=fig_dpi,bbox_inches='tight')
+    template.save('%s%d-daylightcompare-%s.png'%(loc_short,year,timestring),fig_dpi)
     # plt.show()
 
     return stats
@@ -399,31 +259,26 @@ if __name__ == '__main__':
     # -----------------------------------------
 
 
-    utc_data = pd.read_pickle(DATA_PATH)
+    utc_data = load_table( LOC, YEAR, DATA_PATH, STORE_PATH )
 
     dates = utc_data['date']
 
 
-    # Move the data from UTC to local time zone.
+    # Clocks in UTC, shifted to the local time zone, and with DST
     # time shift in seconds
     shift = UTC_OFFSET*60*60
 
-    shift_data = utc_data.copy()
-    shift_data.iloc[:,1:] += shift
-
-
-    dst_start_ind, dst_end_ind = dates.searchsorted([DST_START_DATE,DST_END_DATE])
-
-    dst_data = shift_data.copy()
-    dst_data.iloc[ dst_start_ind : dst_end_ind , 1: ] += 60*60
+    shift_policy = ClockPolicy( shift )
+    dst_policy = ClockPolicy.with_zone_dst( shift, dates, DST_ZONE )
+    policies = [ UTC, shift_policy, dst_policy ]
 
     # -----------------------------------------
     # ------------- MAKE PLOT -----------------
     # -----------------------------------------
 
     midnight = time(0,0,0)
-    make_daylight_hours_plot( midnight, midnight, LOC, LOCNAME, YEAR, DPI, PLOT_COLORS, shift_data )
-    make_daylight_hours_comparison_plot( WAKE_TIME, SLEEP_TIME, LOC, LOCNAME, YEAR, DPI, PLOT_COLORS, utc_data, shift_data, dst_data )
+    make_daylight_hours_plot( midnight, midnight, LOC, LOCNAME, YEAR, DPI, PLOT_COLORS, utc_data, shift_policy )
+    make_daylight_hours_comparison_plot( WAKE_TIME, SLEEP_TIME, LOC, LOCNAME, YEAR, DPI, PLOT_COLORS, utc_data, policies )
 
     plt.clf()
     plt.close()
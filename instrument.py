@@ -0,0 +1,165 @@
+
+# Timing and memory of the stages of the plot pipeline.
+
+# A stage is a block of code (with stage('savefig'): ...) or a function
+# (@timed). For each stage the number of calls, the wall time and the peak
+# memory allocated in it (tracemalloc) are added up, under the names of the
+# stages it is in, e.g. 'make_sunny_morning_plot/savefig'. Stages in the
+# worker processes of plot_all.py are sent back with the plots and added in.
+# The times are inclusive: a stage's time includes that of the stages in it.
+#
+# Off by default; when off, a stage costs one test of a global.
+# Turned on by INSTRUMENT in plot_all.py or by the environment variable
+# SUN_INSTRUMENT (1: times and memory, time: times only, which does not
+# slow down the code as tracemalloc does). The report is written as JSON.
+#
+# Usage:
+# SUN_INSTRUMENT=1 python3 plot_all.py
+# (report in INSTRUMENT_REPORT, 'instrument.json')
+
+import os
+import json
+import time
+import functools
+import contextlib
+import tracemalloc
+
+
+ENVIRONMENT_VARIABLE = 'SUN_INSTRUMENT'
+
+# None when off, otherwise { 'memory': bool }
+_settings = None
+# Name -> [ calls, seconds, max seconds, peak bytes ]
+_stats = {}
+# The stages being run: [ name, start bytes, peak bytes ]
+_stack = []
+# and those set aside by collect, whose peaks still count
+_outer_frames = []
+
+_off = contextlib.nullcontext()
+
+
+def enable( memory=True ):
+    global _settings
+    _settings = { 'memory': memory }
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def disable():
+    global _settings
+    _settings = None
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+def settings():
+    # What to pass to enable(**settings) in another process (None when off)
+    return _settings
+
+
+def _enable_from_environment():
+    value = os.environ.get( ENVIRONMENT_VARIABLE, '' ).strip().lower()
+    if value and value not in ('0', 'no', 'off'):
+        enable( memory=( value != 'time' ) )
+
+
+def _add( name, calls, seconds, max_seconds, peak ):
+    stats = _stats.setdefault( name, [ 0, 0.0, 0.0, 0 ] )
+    stats[0] += calls
+    stats[1] += seconds
+    stats[2] = max( stats[2], max_seconds )
+    stats[3] = max( stats[3], peak )
+
+
+@contextlib.contextmanager
+def _stage( name ):
+    memory = _settings['memory'] and tracemalloc.is_tracing()
+    if _stack:
+        name = _stack[-1][0] + '/' + name
+
+    if memory:
+        # The peak so far belongs to the enclosing stages
+        current, peak = tracemalloc.get_traced_memory()
+        for frame in _stack + _outer_frames:
+            frame[2] = max( frame[2], peak )
+        tracemalloc.reset_peak()
+    else:
+        current = 0
+
+    frame = [ name, current, current ]
+    _stack.append( frame )
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        _stack.pop()
+        peak = 0
+        if memory:
+            peak = max( frame[2], tracemalloc.get_traced_memory()[1] )
+            for outer in _stack + _outer_frames:
+                outer[2] = max( outer[2], peak )
+            peak -= frame[1]
+        _add( name, 1, seconds, seconds, peak )
+
+
+def stage( name ):
+    # Context manager recording the block as the stage name
+    if _settings is None:
+        return _off
+    return _stage( name )
+
+
+def timed( function=None, name=None ):
+    # Decorator recording each call of the function as a stage
+    # (named after the function, or name)
+    if function is None:
+        return lambda function: timed( function, name )
+    stage_name = name or function.__name__
+
+    @functools.wraps( function )
+    def timed_function( *args, **kwargs ):
+        if _settings is None:
+            return function( *args, **kwargs )
+        with _stage( stage_name ):
+            return function( *args, **kwargs )
+    return timed_function
+
+
+@contextlib.contextmanager
+def collect():
+    # The stages recorded in the block, kept apart from the others and
+    # outside the stages being run (e.g. to send them back from a worker
+    # process), as a dictionary that is filled when the block ends:
+    # merge adds them in.
+    global _stats, _stack, _outer_frames
+    outer_stats, outer_stack, outer_frames = _stats, _stack, _outer_frames
+    _stats, _stack, _outer_frames = {}, [], outer_stack + outer_frames
+    collected = {}
+    try:
+        yield collected
+    finally:
+        collected.update( _stats )
+        _stats, _stack, _outer_frames = outer_stats, outer_stack, outer_frames
+
+
+def merge( stats ):
+    # Add stages from collect, in the stage being run (if any)
+    prefix = _stack[-1][0] + '/' if _stack else ''
+    for name, values in stats.items():
+        _add( prefix + name, *values )
+
+
+def report():
+    stages = { name: { 'calls': calls, 'seconds': seconds, 'max_seconds': max_seconds, 'peak_mib': peak / 2**20 }
+               for name, (calls, seconds, max_seconds, peak) in sorted( _stats.items() ) }
+    return { 'memory': bool( _settings and _settings['memory'] ), 'stages': stages }
+
+
+def write_report( path ):
+    with open( path, 'w' ) as f:
+        json.dump( report(), f, indent=1 )
+
+
+_enable_from_environment()
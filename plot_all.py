@@ -1,14 +1,25 @@
 
+import io
 import os
+import contextlib
+from concurrent.futures import ProcessPoolExecutor
 
 import numpy as np
+import matplotlib
+# The plots are only saved to files; Agg also works in the worker processes
+matplotlib.use('Agg')
 import matplotlib.pyplot as plt
-from datetime import date, time
-import pandas as pd
+from datetime import time
 
 from sunny_mornings import make_sunny_morning_plot
 from hours_of_daylight import make_daylight_hours_plot, make_daylight_hours_comparison_plot
+from daylight_core import average_daylight_sweep, sunny_mornings_table, window_seconds
 from sunshine_carpet import make_sunshine_carpet_plot
+from carpet_raster import make_sunshine_carpet_raster
+from sun_store import load_table
+from clock_policy import ClockPolicy, UTC
+from build_manifest import BuildManifest, input_hash
+import instrument
 
 # -----------------------------------------
 # ----------- CONFIG ----------------------
@@ -18,48 +29,74 @@ LOC = 'RVK'
 LOCNAME = r' í Reykjavík'
 # Offset in hours from UTC in winter.
 UTC_OFFSET = -1
+# DST on the same days as in this time zone
+# (in 2018, from March 25 to October 28)
+DST_ZONE = 'Europe/London'
 
 
 # LOC = 'PDL'
 # LOCNAME = r' í Ponta Delgada'
 # # Offset in hours from UTC in winter.
 # UTC_OFFSET = -1
+# DST_ZONE = 'Europe/London'
 
 # LOC = 'PRA'
 # LOCNAME = r' í Praia'
 # # Offset in hours from UTC in winter.
 # UTC_OFFSET = -1
+# DST_ZONE = 'Europe/London'
 
 
 # LOC = 'HVK'
 # LOCNAME = r' á Húsavík'
 # # Offset in hours from UTC in winter.
 # UTC_OFFSET = -1
+# DST_ZONE = 'Europe/London'
 
 # LOC = 'TOS'
 # LOCNAME = r' í Tromsø'
 # # Offset in hours from UTC in winter.
 # UTC_OFFSET = 1
+# DST_ZONE = 'Europe/London'
 
 # LOC = 'MSK'
 # LOCNAME = r' í Moskvu'
 # # Offset in hours from UTC in winter.
 # UTC_OFFSET = 3
+# DST_ZONE = 'Europe/London'
 
 # LOC = 'SCL'
 # LOCNAME = r' í Santiago'
 # # Offset in hours from UTC in winter.
 # UTC_OFFSET = -5
+# # DST in the southern hemisphere summer
+# DST_ZONE = 'America/Santiago'
 
 
 YEAR = 2018
 DATA_PATH = '%s%d.pkl' %(LOC,YEAR)
+# The data is read from the columnar store (see sun_store.py)
+# if it has LOC and YEAR, otherwise from DATA_PATH.
+STORE_PATH = 'sun_store'
 
+# Number of processes drawing the plots (1 draws them one after another)
+N_WORKERS = os.cpu_count()
+
+# Draw all the plots again, also those whose inputs have not changed
+# since the last run (see build_manifest.py)
+REBUILD_ALL = False
+
+# 'matplotlib', or 'raster' to write the carpets directly as PNG files
+# (carpet_raster.py: faster, but without axes and titles)
+CARPET_RENDERER = 'matplotlib'
+
+# Record the time, calls and peak memory of each stage and plot
+# and write them to INSTRUMENT_REPORT (see instrument.py;
+# also turned on by the environment variable SUN_INSTRUMENT)
+INSTRUMENT = False
+INSTRUMENT_REPORT = 'instrument.json'
 
 
-# In 2018, DST starts on March 25 and ends October 28
-DST_START_DATE = date(YEAR,3,25)
-DST_END_DATE = date(YEAR,10,28)
 
 
 plt.rc('font', family='Times New Roman')
@@ -84,92 +121,93 @@ sunshine_carpet_colors = [DAY_COLOR, TWI_COLOR, NIGHT_COLOR, NOON_COLOR, SLEEP_C
 
 
 # -----------------------------------------
-# ------------- LOAD DATA -----------------
+# ------------- PLOT JOBS -----------------
 # -----------------------------------------
-print('Loading %s' % DATA_PATH)
-
-utc_data = pd.read_pickle(DATA_PATH)
-
-dates = utc_data['date']
-
-
-# Move the data from UTC to local time zone.
-# time shift in seconds
-shift = UTC_OFFSET*60*60
 
-shift_data = utc_data.copy()
-shift_data.iloc[:,1:] += shift
+def render_job( plot_dir, plot_function, args, instrument_settings=None ):
+    # Draw one plot (or set of plots) into plot_dir.
+    # Returns the result of plot_function and what it printed,
+    # so that the output of parallel jobs can be printed in order,
+    # and the stages recorded in it (instrument_settings: those of
+    # the main process, as this may be a worker process).
+    if instrument.settings() != instrument_settings:
+        if instrument_settings is None:
+            instrument.disable()
+        else:
+            instrument.enable( **instrument_settings )
+
+    cwd = os.getcwd()
+    output = io.StringIO()
+    with instrument.collect() as stages:
+        try:
+            os.chdir( plot_dir )
+            with contextlib.redirect_stdout( output ), instrument.stage( plot_function.__name__ ):
+                result = plot_function( *args )
+        finally:
+            plt.close('all')
+            os.chdir( cwd )
+    return result, output.getvalue(), stages
+
+
+def render_jobs( jobs, n_workers=N_WORKERS, pool=None ):
+    # Results of the jobs (plot_dir, plot_function, args)
+    # and what they printed, in order.
+    # pool: a ProcessPoolExecutor to use (and keep) instead of a new one
+    settings = [ instrument.settings() ]*len(jobs)
+    if pool is not None:
+        rendered = list( pool.map( render_job, *zip(*jobs), settings ) ) if jobs else []
+    elif len(jobs) > 1 and ( n_workers is None or n_workers > 1 ):
+        with ProcessPoolExecutor( n_workers ) as pool:
+            rendered = list( pool.map( render_job, *zip(*jobs), settings ) )
+    else:
+        rendered = [ render_job( *job, instrument_settings=job_settings ) for job, job_settings in zip( jobs, settings ) ]
 
+    for _, _, stages in rendered:
+        instrument.merge( stages )
+    return [ (result, printed) for result, printed, _ in rendered ]
 
-dst_start_ind, dst_end_ind = dates.searchsorted([DST_START_DATE,DST_END_DATE])
 
-dst_data = shift_data.copy()
-dst_data.iloc[ dst_start_ind : dst_end_ind , 1: ] += 60*60
+def render_stale_jobs( plot_dir, jobs, outputs, n_workers=N_WORKERS, rebuild_all=REBUILD_ALL, pool=None ):
+    # render_jobs for the jobs (in plot_dir) whose inputs have changed,
+    # or whose files (outputs[i] for job i) are missing, since the last run;
+    # the results of the others are taken from the manifest (see build_manifest.py).
+    # Prints what the jobs printed, in order, and returns their results.
+    manifest = BuildManifest( plot_dir )
 
+    keys = [ job_outputs[0] for job_outputs in outputs ]
+    digests = [ input_hash( plot_function, args ) for _, plot_function, args in jobs ]
+    stale = [ ind for ind in range(len(jobs))
+              if rebuild_all or not manifest.is_fresh( keys[ind], digests[ind], outputs[ind] ) ]
 
-# -----------------------------------------
-# ------------ MAKE PLOTS -----------------
-# -----------------------------------------
+    for ind, (result, printed) in zip( stale, render_jobs( [ jobs[ind] for ind in stale ], n_workers, pool ) ):
+        manifest.record( keys[ind], digests[ind], outputs[ind], result, printed )
+    if stale:
+        manifest.save()
 
-newdir = '%s%d_plots' %(LOC,YEAR)
+    if len(stale) < len(jobs):
+        print( '%d of %d plot jobs up to date' % (len(jobs)-len(stale), len(jobs)) )
 
-if not newdir in os.listdir():
-    print('New directory: %s'%newdir)
-    os.mkdir(newdir)
+    results = []
+    for key in keys:
+        result, printed = manifest.result( key )
+        print( printed, end='' )
+        results.append( result )
+    return results
 
-os.chdir(newdir)
 
 # -----------------------------------------
-# ------------ MAKE PLOTS -----------------
+# ----------- PRINT TABLES ----------------
 # -----------------------------------------
 
-carpet_wake = time(7,0,0)
-carpet_sleep = time(23,0,0)
-make_sunshine_carpet_plot( carpet_wake, carpet_sleep, LOC, LOCNAME, YEAR, DPI, sunshine_carpet_colors, utc_data, UTC_OFFSET, DST_START_DATE, DST_END_DATE )
-
-midnight = time(0,0,0)
-make_daylight_hours_plot( midnight, midnight, LOC, LOCNAME, YEAR, DPI, daylight_hours_colors, shift_data )
-
-wake_hrs = np.arange(5,12)
-sleep_hrs = (wake_hrs+16)%24
-
-work_hrs = (wake_hrs+9)%24
-home_hrs = (wake_hrs+15)%24
+def utc_label( utc_offset ):
+    # 'UTC-1', or e.g. 'UTC+5:30' for offsets (in hours) that are not whole hours
+    minutes = int( round( utc_offset*60 ) )
+    sign = '-' if minutes < 0 else '+'
+    hours, minutes = divmod( abs(minutes), 60 )
+    return 'UTC%s%d' % (sign, hours) + ( ':%02d' % minutes if minutes else '' )
 
-morning_table = []
-work_table = []
-wake_table = []
-
-for iii in range(len(wake_hrs)):
-
-    wake_time = time(wake_hrs[iii],0,0)
-    sleep_time = time(sleep_hrs[iii],0,0)
-
-    work_time = time(work_hrs[iii],0,0)
-    home_time = time(home_hrs[iii],0,0)
-
-    
-    wake_stats = make_daylight_hours_comparison_plot( wake_time, sleep_time, LOC, LOCNAME, YEAR, DPI, daylight_hours_colors, utc_data, shift_data, dst_data )
-    wake_table.append(wake_stats)
-
-    work_stats = make_daylight_hours_comparison_plot( work_time, home_time, LOC, LOCNAME, YEAR, DPI, daylight_hours_colors, utc_data, shift_data, dst_data )
-    work_table.append(work_stats)
-
-    morning_stats = make_sunny_morning_plot( wake_time, LOC, LOCNAME, YEAR, DPI, sunny_mornings_colors, utc_data, shift_data, dst_data )
-    morning_table.append( morning_stats )
-
-    plt.clf()
-    plt.close()
-
-os.chdir('..')
-
-
-
-# -----------------------------------------
-# ----------- PRINT TABLES ----------------
-# -----------------------------------------
 
-def print_table( table, hrs1, hrs2=None ):
+def print_table( table, hrs1, hrs2=None, utc_offset=UTC_OFFSET ):
     table = np.array(table).T
     table[1] -= table[0]
     table[2] -= table[0]
@@ -187,7 +225,7 @@ def print_table( table, hrs1, hrs2=None ):
     str1 += ', '.join(['%d'%val for val in table[0]])
     print(str1)
 
-    timezone = 'UTC%+d' % UTC_OFFSET
+    timezone = utc_label( utc_offset )
     str2 = timezone + ', '
     str2 += ', '.join(['%+d'%val for val in table[1]])
     print(str2)
@@ -195,22 +233,124 @@ def print_table( table, hrs1, hrs2=None ):
     str3 = timezone + r' + sumartími, '
     str3 += ', '.join(['%+d'%val for val in table[2]])
     print(str3)
-    
 
 
+@instrument.timed
+def plot_location( loc, location_name, year, utc_offset, dst_zone, data_path=None, store_path=STORE_PATH, n_workers=N_WORKERS, carpet_renderer=CARPET_RENDERER, rebuild_all=REBUILD_ALL, pool=None ):
+    # All the plots of one location-year, in './[LOC][YEAR]_plots/'.
+    # pool: a ProcessPoolExecutor shared by many locations (see plot_batch.py)
+
+    # -----------------------------------------
+    # ------------- LOAD DATA -----------------
+    # -----------------------------------------
+    if data_path is None:
+        data_path = '%s%d.pkl' % (loc, year)
+    print('Loading %s' % data_path)
+
+    with instrument.stage( 'load_table' ):
+        utc_data = load_table( loc, year, data_path, store_path )
+
+    dates = utc_data['date']
+
+
+    # Clocks in UTC, shifted to the local time zone, and with DST
+    # time shift in seconds
+    shift = utc_offset*60*60
+
+    with instrument.stage( 'policies' ):
+        shift_policy = ClockPolicy( shift )
+        dst_policy = ClockPolicy.with_zone_dst( shift, dates, dst_zone )
+        policies = [ UTC, shift_policy, dst_policy ]
+
+
+    newdir = '%s%d_plots' %(loc,year)
+
+    if not newdir in os.listdir():
+        print('New directory: %s'%newdir)
+        os.mkdir(newdir)
+
+    plot_dir = os.path.abspath( newdir )
+
+    # -----------------------------------------
+    # ------------ MAKE PLOTS -----------------
+    # -----------------------------------------
+
+    wake_hrs = np.arange(5,12)
+    sleep_hrs = (wake_hrs+16)%24
+
+    work_hrs = (wake_hrs+9)%24
+    home_hrs = (wake_hrs+15)%24
+
+    # Average daylight for all windows and clocks at once
+    wake_windows = [ window_seconds( time(wake_hrs[iii],0,0), time(sleep_hrs[iii],0,0) ) for iii in range(len(wake_hrs)) ]
+    work_windows = [ window_seconds( time(work_hrs[iii],0,0), time(home_hrs[iii],0,0) ) for iii in range(len(wake_hrs)) ]
+    start_times, stop_times = np.array( wake_windows + work_windows ).T
+
+    sweep_daylight, sweep_twilight = average_daylight_sweep( utc_data, start_times, stop_times, policies )
+    wake_daylight = [ (sweep_daylight[iii], sweep_twilight[iii]) for iii in range(len(wake_hrs)) ]
+    work_daylight = [ (sweep_daylight[iii], sweep_twilight[iii]) for iii in range(len(wake_hrs), 2*len(wake_hrs)) ]
+
+    # Sunny mornings at every wake minute, for each clock
+    morning_tables = [ sunny_mornings_table( utc_data, policy ) for policy in policies ]
+
+    # The plots, each an independent job
+    carpet_wake = time(7,0,0)
+    carpet_sleep = time(23,0,0)
+    midnight = time(0,0,0)
+    if carpet_renderer == 'raster':
+        carpet_function = make_sunshine_carpet_raster
+    else:
+        carpet_function = make_sunshine_carpet_plot
+
+    jobs = [ ( plot_dir, carpet_function, ( carpet_wake, carpet_sleep, loc, location_name, year, DPI, sunshine_carpet_colors, utc_data, shift_policy, dst_policy ) ),
+             ( plot_dir, make_daylight_hours_plot, ( midnight, midnight, loc, location_name, year, DPI, daylight_hours_colors, utc_data, shift_policy ) ) ]
+    # and the files each job writes
+    prefix = '%s%d' % (loc, year)
+    outputs = [ [ prefix + '-carpet-%s.png' % clock for clock in ('utc', 'shift', 'dst') ],
+                [ prefix + '-daylight.png' ] ]
+
+    for iii in range(len(wake_hrs)):
+
+        wake_time = time(wake_hrs[iii],0,0)
+        sleep_time = time(sleep_hrs[iii],0,0)
+
+        work_time = time(work_hrs[iii],0,0)
+        home_time = time(home_hrs[iii],0,0)
+
+        jobs += [ ( plot_dir, make_daylight_hours_comparison_plot, ( wake_time, sleep_time, loc, location_name, year, DPI, daylight_hours_colors, utc_data, policies, wake_daylight[iii] ) ),
+                  ( plot_dir, make_daylight_hours_comparison_plot, ( work_time, home_time, loc, location_name, year, DPI, daylight_hours_colors, utc_data, policies, work_daylight[iii] ) ),
+                  ( plot_dir, make_sunny_morning_plot, ( wake_time, loc, location_name, year, DPI, sunny_mornings_colors, utc_data, policies, morning_tables ) ) ]
+        outputs += [ [ prefix + '-daylightcompare-%s-%s.png' % (wake_time.strftime('%H%M'), sleep_time.strftime('%H%M')) ],
+                     [ prefix + '-daylightcompare-%s-%s.png' % (work_time.strftime('%H%M'), home_time.strftime('%H%M')) ],
+                     [ prefix + '-sunnymornings-%s.png' % wake_time.strftime('%H%M') ] ]
+
+    with instrument.stage( 'render' ):
+        results = render_stale_jobs( plot_dir, jobs, outputs, n_workers, rebuild_all, pool )
 
-print('\nSunny mornings:')
-print_table(morning_table, wake_hrs)
+    # Three results for each wake time after the first two plots
+    wake_table = results[2::3]
+    work_table = results[3::3]
+    morning_table = results[4::3]
 
-print('\nBright waking hours:')
-print_table(wake_table, wake_hrs, sleep_hrs)
+    print('\nSunny mornings:')
+    print_table(morning_table, wake_hrs, utc_offset=utc_offset)
 
-print('\nDaylight after work:')
-print_table(work_table, work_hrs, home_hrs)
+    print('\nBright waking hours:')
+    print_table(wake_table, wake_hrs, sleep_hrs, utc_offset=utc_offset)
 
+    print('\nDaylight after work:')
+    print_table(work_table, work_hrs, home_hrs, utc_offset=utc_offset)
 
+    return morning_table, wake_table, work_table
 
 
+if __name__ == '__main__':
 
+    if INSTRUMENT and instrument.settings() is None:
+        instrument.enable()
 
+    plot_location( LOC, LOCNAME, YEAR, UTC_OFFSET, DST_ZONE, DATA_PATH, STORE_PATH, N_WORKERS, CARPET_RENDERER, REBUILD_ALL )
 
+    if instrument.settings() is not None:
+        instrument.write_report( INSTRUMENT_REPORT )
+        print( '\nStages written to %s' % INSTRUMENT_REPORT )
@@ -0,0 +1,93 @@
+
+# All the plots of plot_all.py for many locations in one process.
+
+# The locations are read from a CSV file (LOCATIONS_PATH) with the columns
+#   loc, location_name, year, utc_offset, dst_zone
+# as in the CONFIG of plot_all.py (location_name without the leading space,
+# e.g. 'í Reykjavík'). The imports, the opened data store, the time zone
+# tables, and the worker processes with their figure templates are shared
+# by all the locations, and plots that are up to date are not drawn again
+# (see build_manifest.py).
+#
+# Usage:
+# python3 plot_batch.py
+# or
+# python3 plot_batch.py locations.csv
+
+import sys
+import csv
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from plot_all import plot_location, N_WORKERS, CARPET_RENDERER, REBUILD_ALL, STORE_PATH, INSTRUMENT, INSTRUMENT_REPORT
+import instrument
+
+
+# -----------------------------------------
+# ----------- CONFIG ----------------------
+# -----------------------------------------
+
+LOCATIONS_PATH = 'locations.csv'
+
+# -----------------------------------------
+# -----------------------------------------
+# -----------------------------------------
+
+
+def hours( text ):
+    # Whole hours as int (as in plot_all.py), otherwise float
+    value = float( text )
+    return int( value ) if value.is_integer() else value
+
+
+def read_locations( path ):
+    # (loc, location_name, year, utc_offset, dst_zone) of each row
+    with open( path, newline='', encoding='utf-8' ) as f:
+        return [ ( row['loc'], ' ' + row['location_name'], int( row['year'] ),
+                   hours( row['utc_offset'] ), row['dst_zone'] )
+                 for row in csv.DictReader( f ) ]
+
+
+def plot_batch( locations, n_workers=N_WORKERS, carpet_renderer=CARPET_RENDERER, rebuild_all=REBUILD_ALL, store_path=STORE_PATH ):
+    # Returns the locations whose data was not found
+    pool = None
+    if n_workers is None or n_workers > 1:
+        pool = ProcessPoolExecutor( n_workers )
+
+    missing = []
+    try:
+        for loc, location_name, year, utc_offset, dst_zone in locations:
+            start = time.perf_counter()
+            try:
+                plot_location( loc, location_name, year, utc_offset, dst_zone, store_path=store_path, n_workers=n_workers,
+                               carpet_renderer=carpet_renderer, rebuild_all=rebuild_all, pool=pool )
+            except FileNotFoundError as error:
+                print( 'No data for %s%d: %s' % (loc, year, error) )
+                missing.append( (loc, year) )
+                continue
+            print( '%s%d: %.1f s\n' % (loc, year, time.perf_counter() - start) )
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    return missing
+
+
+if __name__ == '__main__':
+
+    locations_path = sys.argv[1] if len(sys.argv) > 1 else LOCATIONS_PATH
+
+    if INSTRUMENT and instrument.settings() is None:
+        instrument.enable()
+
+    start = time.perf_counter()
+    locations = read_locations( locations_path )
+    missing = plot_batch( locations )
+
+    print( '%d locations in %.1f s' % (len(locations) - len(missing), time.perf_counter() - start) )
+    if missing:
+        print( 'No data for: ' + ', '.join( '%s%d' % loc_year for loc_year in missing ) )
+
+    if instrument.settings() is not None:
+        instrument.write_report( INSTRUMENT_REPORT )
+        print( 'Stages written to %s' % INSTRUMENT_REPORT )
@@ -0,0 +1,181 @@
+
+# Search for the clock policy with the most daylight during waking hours.
+
+# Every offset from UTC in steps of OFFSET_STEP, with and without DST,
+# and every (DST start, DST end) pair of days, is scored by the
+# average daylight between WAKE_TIME and SLEEP_TIME over the year.
+#
+# The daylight of each day is computed once for each offset on the grid
+# (daylight_sweep_by_day). With DST of dst_hours on the days [s, e),
+# the total is the total without DST plus P[e] - P[s], where P is the
+# cumulative sum of the gain of the DST offset over the offset on each day,
+# so all the (s, e) pairs of one offset are one subtraction of two vectors.
+# DST over the new year (the southern hemisphere) is e < s: the days [s, end) and [0, e).
+#
+# Usage:
+# python3 policy_search.py
+# prints the best policies for LOC, YEAR, WAKE_TIME and SLEEP_TIME.
+
+import numpy as np
+from datetime import time
+
+from sun_store import load_table
+from clock_policy import ClockPolicy
+from daylight_core import daylight_sweep_by_day, daylight_by_day, window_seconds
+
+
+# -----------------------------------------
+# ----------- CONFIG ----------------------
+# -----------------------------------------
+
+WAKE_TIME = time(7,0,0)
+SLEEP_TIME = time(23,0,0)
+
+LOC = 'RVK'
+YEAR = 2018
+DATA_PATH = '%s%d.pkl' %(LOC,YEAR)
+STORE_PATH = 'sun_store'
+
+# Offsets from UTC to try, in hours
+MIN_OFFSET = -12
+MAX_OFFSET = 14
+# in steps of OFFSET_STEP minutes
+OFFSET_STEP = 15
+
+DST_HOURS = 1
+
+# Weight of twilight relative to sunlight in the score
+TWILIGHT_WEIGHT = 0
+
+# Number of policies to print
+TOP = 10
+# DST periods of one offset whose scores differ by less than this
+# (seconds of daylight per day; 3.6 s = 0.001 hours, as printed) are listed once
+SCORE_RESOLUTION = 3.6
+
+# For comparison: the clocks of plot_all.py
+# Offset in hours from UTC in winter.
+UTC_OFFSET = -1
+DST_ZONE = 'Europe/London'
+
+# -----------------------------------------
+# -----------------------------------------
+# -----------------------------------------
+
+
+def daylight_score( sunlight, twilight, twilight_weight=0 ):
+    return sunlight + twilight_weight*twilight
+
+
+def policy_score( data, start_time, stop_time, policy, twilight_weight=0 ):
+    # Average seconds of daylight per day between start_time and stop_time
+    # in the time of the clock policy
+    sunlight, twilight = daylight_by_day( data, start_time, stop_time, policy )
+    return daylight_score( sunlight, twilight, twilight_weight ).mean()
+
+
+def dst_policy( utc_offset, dst_start, dst_end, number_of_days, dst_hours=1, name=None ):
+    # Policy with DST on the days [dst_start, dst_end),
+    # or [dst_start, number_of_days) and [0, dst_end) if dst_end < dst_start
+    dst_minutes = np.zeros( number_of_days, dtype=np.int16 )
+    if dst_end >= dst_start:
+        dst_minutes[ dst_start:dst_end ] = 60*dst_hours
+    else:
+        dst_minutes[ dst_start: ] = 60*dst_hours
+        dst_minutes[ :dst_end ] = 60*dst_hours
+    return ClockPolicy( utc_offset, dst_minutes, name )
+
+
+def search_policies( data, start_time, stop_time, offsets, dst_hours=1, twilight_weight=0, top=10, resolution=1 ):
+    # The top policies between the offsets (seconds, a multiple of the grid step)
+    # with every DST period (or none), by average daylight per day (seconds)
+    # between start_time and stop_time.
+    # Of the DST periods of one offset whose scores are the same when rounded
+    # to resolution (seconds per day), only the best one is listed.
+    # Returns a list of (score, offset, dst_start, dst_end), best first;
+    # dst_start = dst_end = None for no DST.
+
+    offsets = np.asarray( offsets )
+    step = offsets[1] - offsets[0] if len(offsets) > 1 else dst_hours*3600
+    dst_steps = int( round( dst_hours*3600 / step ) )
+    if dst_steps*step != dst_hours*3600:
+        raise ValueError( 'The DST must be a multiple of the offset step' )
+
+    # Daily daylight for every offset, and every offset + DST
+    grid = np.append( offsets, offsets[-1] + step*np.arange( 1, dst_steps+1 ) )
+    sunlight, twilight = daylight_sweep_by_day( data, [start_time], [stop_time], list(grid) )
+    daily = daylight_score( sunlight[0], twilight[0], twilight_weight )
+
+    number_of_days = daily.shape[1]
+    starts = np.arange( number_of_days )[:,None]
+    ends = np.arange( number_of_days+1 )[None,:]
+    wraps = ends < starts
+    dst_days = ends - starts + wraps*number_of_days
+
+    candidates = []
+    for ind, offset in enumerate( offsets ):
+        total = daily[ind].sum()
+        candidates.append( ( total, offset, None, None ) )
+
+        # Gain of DST up to each day
+        gain = np.zeros( number_of_days+1 )
+        np.cumsum( daily[ind+dst_steps] - daily[ind], out=gain[1:] )
+
+        # values[s, e]: total with DST on the days [s, e)
+        values = total + gain[None,:] - gain[:number_of_days,None] + wraps*gain[-1]
+        # s == e is no DST, counted above, and [s, end) + [0, 0) is [s, end);
+        # DST that does not add daylight is no better than no DST
+        values[ (starts == ends) | (wraps & (ends == 0)) | (values <= total) ] = -np.inf
+
+        # Many DST periods have (nearly) the same total, moving a first or
+        # last day where DST makes little or no difference: keep one period
+        # for each of the top scores (rounded to resolution), the best one
+        # and of equal totals the shortest.
+        ranks = values - 1e-6*dst_days
+        plateaus = np.round( values / (number_of_days*resolution) )
+        for plateau in np.unique( plateaus[ values > -np.inf ] )[-top:]:
+            best = np.argmax( np.where( plateaus == plateau, ranks, -np.inf ) )
+            dst_start, dst_end = np.unravel_index( best, values.shape )
+            candidates.append( ( values[dst_start, dst_end], offset, dst_start, dst_end ) )
+
+    def rank( candidate ):
+        score, offset, dst_start, dst_end = candidate
+        if dst_start is None:
+            return -score
+        return -score + 1e-6*dst_days[dst_start, dst_end]
+
+    candidates.sort( key=rank )
+    return [ ( score/number_of_days, offset, dst_start, dst_end )
+             for score, offset, dst_start, dst_end in candidates[:top] ]
+
+
+def policy_label( offset, dst_start, dst_end, dates ):
+    label = 'UTC%s%d:%02d' % ( '-' if offset < 0 else '+', abs(offset)//3600, abs(offset)%3600//60 )
+    if dst_start is not None:
+        # First and last day of DST
+        dst_start_date = dates[dst_start].strftime('%d.%m.')
+        dst_end_date = dates[ (dst_end-1) % len(dates) ].strftime('%d.%m.')
+        label += ' + DST %s-%s' % (dst_start_date, dst_end_date)
+    return label
+
+
+if __name__ == '__main__':
+
+    utc_data = load_table( LOC, YEAR, DATA_PATH, STORE_PATH )
+    dates = list( utc_data['date'] )
+
+    start_time, stop_time = window_seconds( WAKE_TIME, SLEEP_TIME )
+    offsets = np.arange( MIN_OFFSET*60, MAX_OFFSET*60 + 1, OFFSET_STEP ) * 60
+
+    ranking = search_policies( utc_data, start_time, stop_time, offsets, DST_HOURS, TWILIGHT_WEIGHT, TOP, SCORE_RESOLUTION )
+
+    print( '%s%d: %s-%s' % (LOC, YEAR, WAKE_TIME.strftime('%H:%M'), SLEEP_TIME.strftime('%H:%M')) )
+    print( '\tClock,\tDaylight (hours per day)' )
+    for score, offset, dst_start, dst_end in ranking:
+        print( '\t%s,\t%.3f' % (policy_label( offset, dst_start, dst_end, dates ), score/3600) )
+
+    shift = UTC_OFFSET*60*60
+    current = ClockPolicy.with_zone_dst( shift, dates, DST_ZONE )
+    print( 'Current clock:' )
+    print( '\t%s,\t%.3f' % ( policy_label( shift, None, None, dates ), policy_score( utc_data, start_time, stop_time, ClockPolicy(shift), TWILIGHT_WEIGHT )/3600 ) )
+    print( '\t%s + DST (%s),\t%.3f' % ( policy_label( shift, None, None, dates ), DST_ZONE, policy_score( utc_data, start_time, stop_time, current, TWILIGHT_WEIGHT )/3600 ) )
@@ -0,0 +1,110 @@
+
+# On-disk cache of responses from https://sunrise-sunset.org/
+
+# Each response is kept in its own file, named by a hash of the query string
+# of the request (lat, lng, date, exactly as sent), so a day that has been downloaded once
+# is never downloaded again, and an interrupted download resumes
+# from where it stopped.
+# The total size of the cache is kept under max_bytes by removing
+# the least recently used responses (by file modification time,
+# which is updated on every read).
+
+import os
+import json
+import hashlib
+import threading
+import tempfile
+
+from sunrise_sunset_api import request_query
+
+
+CACHE_DIR = 'api_cache'
+CACHE_MAX_BYTES = 100 * 2**20
+
+
+def request_key( lat, lng, day ):
+    return hashlib.sha256( request_query( lat, lng, day ).encode() ).hexdigest()
+
+
+class ResponseCache:
+
+    def __init__( self, directory=CACHE_DIR, max_bytes=CACHE_MAX_BYTES ):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+
+        os.makedirs( directory, exist_ok=True )
+
+        # path -> (last use, size) of every cached response
+        self.entries = {}
+        self.total_bytes = 0
+        for shard in os.scandir( directory ):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir( shard.path ):
+                if entry.name.endswith( '.json' ):
+                    stat = entry.stat()
+                    self.entries[entry.path] = (stat.st_mtime, stat.st_size)
+                    self.total_bytes += stat.st_size
+
+    def _path( self, lat, lng, day ):
+        key = request_key( lat, lng, day )
+        return os.path.join( self.directory, key[:2], key + '.json' )
+
+    def get( self, lat, lng, day ):
+        # Cached results for the day, or None
+        path = self._path( lat, lng, day )
+        try:
+            with open( path ) as f:
+                results = json.load( f )
+        except (OSError, ValueError):
+            return None
+
+        try:
+            os.utime( path )
+        except OSError:
+            pass
+        with self.lock:
+            if path in self.entries:
+                self.entries[path] = (os.path.getmtime( path ), self.entries[path][1])
+
+        return results
+
+    def put( self, lat, lng, day, results ):
+        path = self._path( lat, lng, day )
+        os.makedirs( os.path.dirname(path), exist_ok=True )
+
+        body = json.dumps( results ).encode()
+
+        # Write to a temporary file first so that an interrupted run
+        # never leaves a partial response behind
+        fd, tmp_path = tempfile.mkstemp( dir=os.path.dirname(path), suffix='.tmp' )
+        with os.fdopen( fd, 'wb' ) as f:
+            f.write( body )
+        os.replace( tmp_path, path )
+
+        with self.lock:
+            if path in self.entries:
+                self.total_bytes -= self.entries[path][1]
+            self.entries[path] = (os.path.getmtime( path ), len(body))
+            self.total_bytes += len(body)
+
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict( self ):
+        # Remove the least recently used responses until
+        # the cache is down to 90% of its size limit.
+        target = 0.9 * self.max_bytes
+        for path, (_, size) in sorted( self.entries.items(), key=lambda item: item[1][0] ):
+            if self.total_bytes <= target:
+                break
+            try:
+                os.remove( path )
+            except OSError:
+                pass
+            del self.entries[path]
+            self.total_bytes -= size
+
+    def __len__( self ):
+        return len( self.entries )
@@ -0,0 +1,155 @@
+
+# Compute sunrise/sunset data offline.
+
+# Produces the same table as get_data.py,
+# (date | twilight_begin | sunrise | noon | sunset | twilight_end)
+# for any range of dates in one pass of array operations,
+# using the NOAA solar position equations.
+# The times are kept as the number of seconds from midnight (UTC)
+# of the given date.
+#
+# Polar days follow the sunrise-sunset.org convention:
+# if the sun (or the twilight) does not set, the event is given
+# as 1970-01-01T00:00:01 UTC, a very negative number of seconds.
+# If the sun does not rise at all, sunrise and sunset
+# are both put at noon, i.e. a day of zero length
+# (and likewise for the twilight).
+
+import numpy as np
+import pandas as pd
+from datetime import date
+
+
+SUNRISE_ZENITH = 90.833
+CIVIL_TWILIGHT_ZENITH = 96.0
+
+seconds_in_day = 24*60*60
+minutes_in_day = 24*60
+
+# Julian day of 1970-01-01 00:00 UTC
+JD_UNIX_EPOCH = 2440587.5
+
+col_names = [ 'date', 'twilight_begin', 'sunrise', 'noon', 'sunset', 'twilight_end' ]
+
+
+def date_range( start_date, end_date ):
+    # Days from start_date to end_date (inclusive) as datetime64[D]
+    return np.arange( np.datetime64(start_date, 'D'), np.datetime64(end_date, 'D') + 1 )
+
+
+def _sun_position( julian_day ):
+    # Declination (radians) and equation of time (minutes)
+    T = (julian_day - 2451545.0) / 36525.0
+
+    mean_long = np.radians( (280.46646 + T*(36000.76983 + T*0.0003032)) % 360 )
+    mean_anom = np.radians( 357.52911 + T*(35999.05029 - 0.0001537*T) )
+    ecc = 0.016708634 - T*(0.000042037 + 0.0000001267*T)
+
+    center = np.sin(mean_anom)*(1.914602 - T*(0.004817 + 0.000014*T)) \
+            + np.sin(2*mean_anom)*(0.019993 - 0.000101*T) \
+            + np.sin(3*mean_anom)*0.000289
+
+    omega = np.radians( 125.04 - 1934.136*T )
+    app_long = np.radians( np.degrees(mean_long) + center - 0.00569 - 0.00478*np.sin(omega) )
+
+    mean_obliq = 23 + (26 + (21.448 - T*(46.815 + T*(0.00059 - T*0.001813)))/60)/60
+    obliq = np.radians( mean_obliq + 0.00256*np.cos(omega) )
+
+    declination = np.arcsin( np.sin(obliq)*np.sin(app_long) )
+
+    y = np.tan(obliq/2)**2
+    eq_of_time = 4*np.degrees( y*np.sin(2*mean_long)
+                                - 2*ecc*np.sin(mean_anom)
+                                + 4*ecc*y*np.sin(mean_anom)*np.cos(2*mean_long)
+                                - 0.5*y*y*np.sin(4*mean_long)
+                                - 1.25*ecc*ecc*np.sin(2*mean_anom) )
+
+    return declination, eq_of_time
+
+
+def _cos_hour_angle( lat, declination, zenith ):
+    phi = np.radians(lat)
+    return np.cos(np.radians(zenith))/(np.cos(phi)*np.cos(declination)) - np.tan(phi)*np.tan(declination)
+
+
+def _solar_noon( jd0, lng ):
+    # Minutes from midnight (UTC), evaluated at the approximate noon
+    noon = minutes_in_day/2 - 4*lng
+    for _ in range(2):
+        _, eq_of_time = _sun_position( jd0 + noon/minutes_in_day )
+        noon = minutes_in_day/2 - 4*lng - eq_of_time
+    return noon
+
+
+def _event( jd0, lat, lng, noon, zenith, sign, iterations=2 ):
+    # Minutes from midnight (UTC) of the morning (sign=-1)
+    # or evening (sign=+1) crossing of the given zenith angle.
+    # Also returns the cosine of the hour angle, which is > 1
+    # if the crossing never happens because the sun stays below,
+    # and < -1 if the sun stays above.
+    t = noon
+    for _ in range(iterations):
+        declination, eq_of_time = _sun_position( jd0 + t/minutes_in_day )
+        cos_ha = _cos_hour_angle( lat, declination, zenith )
+        hour_angle = np.degrees( np.arccos( np.clip(cos_ha, -1, 1) ) )
+        t = minutes_in_day/2 - 4*lng - eq_of_time + sign*4*hour_angle
+    return t, cos_ha
+
+
+def solar_events( lat, lng, days ):
+    # Dictionary of arrays with the times of the events on the given days
+    # (datetime64[D]) in seconds from midnight (UTC).
+
+    days = np.asarray( days, dtype='datetime64[D]' )
+    days_since_epoch = days.astype(np.int64)
+    jd0 = JD_UNIX_EPOCH + days_since_epoch
+
+    # 1970-01-01T00:00:01 relative to each date
+    does_not_set = 1.0 - days_since_epoch*seconds_in_day
+
+    noon = _solar_noon( jd0, lng )
+
+    events = {}
+    events['noon'] = np.round( noon*60 )
+
+    for names, zenith in [ (('sunrise','sunset'), SUNRISE_ZENITH),
+                           (('twilight_begin','twilight_end'), CIVIL_TWILIGHT_ZENITH) ]:
+
+        rise, cos_rise = _event( jd0, lat, lng, noon, zenith, -1 )
+        fall, cos_fall = _event( jd0, lat, lng, noon, zenith, +1 )
+
+        rise = np.round( rise*60 )
+        fall = np.round( fall*60 )
+
+        # The sun does not rise (set): a day of zero length at noon
+        never_rises = (cos_rise > 1) | (cos_fall > 1)
+        rise[never_rises] = events['noon'][never_rises]
+        fall[never_rises] = events['noon'][never_rises]
+
+        # The sun does not set
+        never_sets = (cos_rise < -1) | (cos_fall < -1)
+        rise[never_sets] = does_not_set[never_sets]
+        fall[never_sets] = does_not_set[never_sets]
+
+        events[names[0]] = rise
+        events[names[1]] = fall
+
+    return events
+
+
+def sun_table( lat, lng, start_date, end_date ):
+    # Table in the format of get_data.py for the days
+    # from start_date to end_date (inclusive).
+
+    days = date_range( start_date, end_date )
+    events = solar_events( lat, lng, days )
+
+    data_table = pd.DataFrame( { 'date': days.astype(object) } )
+    for name in col_names[1:]:
+        data_table[name] = events[name]
+
+    return data_table
+
+
+def year_table( lat, lng, year ):
+    return sun_table( lat, lng, date(year,1,1), date(year,12,31) )
@@ -0,0 +1,281 @@
+
+# Columnar store of sunrise/sunset data for many locations and years.
+
+# Instead of one pickled table per place and year, all the data is kept
+# in one directory with one flat binary file per column:
+#   date.bin            datetime64[D]
+#   twilight_begin.bin  int32 seconds from midnight (UTC)
+#   sunrise.bin         ...
+#   noon.bin
+#   sunset.bin
+#   twilight_end.bin
+# and index.json, which gives the rows of each (location, year).
+# The column files are memory-mapped, so opening one location-year
+# reads only its own rows and copies nothing.
+#
+# Usage:
+# python3 sun_store.py RVK2018.pkl LIS2018.pkl ...
+# adds pickled tables from get_data.py to STORE_PATH.
+# python3 sun_store.py --compact
+# removes the rows of years that have been added again.
+
+import os
+import re
+import sys
+import json
+
+import numpy as np
+
+from instrument import stage
+
+
+STORE_PATH = 'sun_store'
+
+col_names = [ 'date', 'twilight_begin', 'sunrise', 'noon', 'sunset', 'twilight_end' ]
+col_dtypes = { 'date': np.dtype('datetime64[D]') }
+for name in col_names[1:]:
+    col_dtypes[name] = np.dtype(np.int32)
+
+INT32_MIN = np.iinfo(np.int32).min
+
+
+class SunStore:
+
+    def __init__( self, path=STORE_PATH ):
+        self.path = path
+        self.index_path = os.path.join( path, 'index.json' )
+        self._columns = None
+
+        if os.path.exists( self.index_path ):
+            with open( self.index_path ) as f:
+                self.index = json.load( f )
+        else:
+            self.index = { 'rows': 0, 'locations': {} }
+
+    def _column_path( self, name ):
+        return os.path.join( self.path, name + '.bin' )
+
+    def _memmaps( self ):
+        # Memory-mapped columns, opened once
+        if self._columns is None:
+            self._columns = {}
+            for name in col_names:
+                if self.index['rows'] > 0:
+                    self._columns[name] = np.memmap( self._column_path(name), dtype=col_dtypes[name],
+                                                     mode='r', shape=(self.index['rows'],) )
+        return self._columns
+
+    def locations( self ):
+        return sorted( self.index['locations'] )
+
+    def years( self, loc ):
+        return sorted( int(year) for year in self.index['locations'][loc]['years'] )
+
+    def __contains__( self, loc_year ):
+        loc, year = loc_year
+        return loc in self.index['locations'] and str(year) in self.index['locations'][loc]['years']
+
+    def columns( self, loc, year ):
+        # Dictionary of read-only arrays for one location-year.
+        # These are views into the memory-mapped files.
+        start, length = self.index['locations'][loc]['years'][str(year)]
+        return { name: column[start:start+length] for name, column in self._memmaps().items() }
+
+    def table( self, loc, year ):
+        # The location-year as a table in the format of get_data.py
+        import pandas as pd
+
+        columns = self.columns( loc, year )
+        data_table = pd.DataFrame( { 'date': columns['date'].astype(object) } )
+        for name in col_names[1:]:
+            data_table[name] = columns[name].astype(float)
+        return data_table
+
+    def _check_columns( self ):
+        # Cut the column files back to the indexed rows: rows written by an add
+        # that failed partway (and so never indexed) would shift the next ones.
+        rows = self.index['rows']
+        for name in col_names:
+            path = self._column_path(name)
+            size = os.path.getsize( path ) if os.path.exists( path ) else 0
+            length = rows * col_dtypes[name].itemsize
+            if size < length:
+                raise ValueError( '%s has %d rows, the index of %s has %d' % (path, size // col_dtypes[name].itemsize, self.path, rows) )
+            if size > length:
+                with open( path, 'r+b' ) as f:
+                    f.truncate( length )
+
+    def _append_column( self, name, values ):
+        with open( self._column_path(name), 'ab' ) as f:
+            f.write( values.tobytes() )
+
+    def add( self, loc, data_table, lat=None, lng=None, time_zone=None ):
+        # Append a table from get_data.py (one or more years).
+        # The dates must be consecutive days; only the years the table
+        # covers from January 1 to December 31 are added, the other days
+        # are left out (so a few days of an adjacent year never replace it).
+        # Years already in the store are replaced; their old rows
+        # stay in the column files, unindexed, until compact().
+        # The index is changed only when all the columns have been written;
+        # if a write fails, the files are cut back to the indexed rows.
+
+        dates = np.asarray( data_table['date'], dtype='datetime64[D]' )
+        if len(dates) == 0 or np.any( np.diff( dates ) != np.timedelta64(1, 'D') ):
+            raise ValueError( 'The dates of %s are not consecutive days' % loc )
+
+        years = dates.astype('datetime64[Y]').astype(int) + 1970
+        year_lengths = 365 + ( (years % 4 == 0) & ( (years % 100 != 0) | (years % 400 == 0) ) )
+        year_counts = np.bincount( years - years[0] )
+        in_full_year = year_counts[ years - years[0] ] == year_lengths
+        if not in_full_year.any():
+            raise ValueError( 'The table of %s has no whole year (%s to %s)' % (loc, dates[0], dates[-1]) )
+
+        rows = np.flatnonzero( in_full_year )
+        dates, years = dates[rows], years[rows]
+
+        columns = { 'date': dates.astype( col_dtypes['date'] ) }
+        for name in col_names[1:]:
+            # Keep the very negative values in range
+            values = np.round( np.asarray( data_table[name], dtype=float )[rows] )
+            columns[name] = np.clip( values, INT32_MIN, None ).astype( col_dtypes[name] )
+
+        # Release the memory maps before the files change
+        self._columns = None
+
+        os.makedirs( self.path, exist_ok=True )
+        self._check_columns()
+        try:
+            for name in col_names:
+                self._append_column( name, columns[name] )
+        except BaseException:
+            self._check_columns()
+            raise
+
+        # A new index, which replaces the old one once it is saved
+        index = json.loads( json.dumps( self.index ) )
+        location = index['locations'].setdefault( loc, { 'years': {} } )
+        if lat is not None:
+            location['lat'] = lat
+            location['lng'] = lng
+        if time_zone is not None:
+            # IANA time zone name
+            location['time_zone'] = time_zone
+
+        start = index['rows']
+        for year in np.unique(years):
+            year_rows = np.flatnonzero( years == year )
+            # Consecutive rows, as the days are
+            location['years'][str(year)] = [ int(start + year_rows[0]), len(year_rows) ]
+        index['rows'] += len(dates)
+
+        self._save_index( index )
+        self.index = index
+
+    def unused_rows( self ):
+        # Rows of replaced years, which compact() removes
+        return self.index['rows'] - sum( length for location in self.index['locations'].values()
+                                         for _, length in location['years'].values() )
+
+    def compact( self ):
+        # Rewrite the column files with only the indexed rows
+        # (in the order of the locations and years), and the index to match.
+        # The new files are written next to the old ones and then renamed,
+        # the index last: if this is interrupted in between, the renamed
+        # files are shorter than the old index says, and opening them fails
+        # (rather than reading wrong rows).
+        if self.unused_rows() == 0:
+            return
+
+        old_columns = self._memmaps()
+        index = json.loads( json.dumps( self.index ) )
+        slices = []
+        start = 0
+        for loc in sorted( index['locations'] ):
+            location_years = index['locations'][loc]['years']
+            for year in sorted( location_years, key=int ):
+                old_start, length = location_years[year]
+                slices.append( slice( old_start, old_start + length ) )
+                location_years[year] = [ start, length ]
+                start += length
+        index['rows'] = start
+
+        for name in col_names:
+            with open( self._column_path(name) + '.tmp', 'wb' ) as f:
+                for rows in slices:
+                    f.write( np.ascontiguousarray( old_columns[name][rows] ).tobytes() )
+
+        del old_columns
+        self._columns = None
+        for name in col_names:
+            os.replace( self._column_path(name) + '.tmp', self._column_path(name) )
+        self._save_index( index )
+        self.index = index
+
+    def _save_index( self, index ):
+        tmp_path = self.index_path + '.tmp'
+        with open( tmp_path, 'w' ) as f:
+            json.dump( index, f )
+        os.replace( tmp_path, self.index_path )
+
+
+_open_stores = {}
+
+def open_store( store_path=STORE_PATH ):
+    # The store at store_path, or None if there is none there.
+    # Stores are kept open (with their index and memory maps) for the next call,
+    # until their index changes, so loading many location-years reads the index once.
+    index_path = os.path.join( store_path, 'index.json' )
+    if not os.path.exists( index_path ):
+        return None
+
+    index_time = os.path.getmtime( index_path )
+    key = os.path.abspath( store_path )
+    if key not in _open_stores or _open_stores[key][0] != index_time:
+        _open_stores[key] = ( index_time, SunStore( store_path ) )
+    return _open_stores[key][1]
+
+
+def load_table( loc, year, data_path=None, store_path=STORE_PATH ):
+    # Data for the location-year from the store if it is there,
+    # otherwise from the pickle '[LOC][YEAR].pkl'.
+    store = open_store( store_path )
+    if store is not None and (loc, year) in store:
+        return store.table( loc, year )
+
+    import pandas as pd
+
+    if data_path is None:
+        data_path = '%s%d.pkl' % (loc, year)
+    with stage( 'read_pickle' ):
+        return pd.read_pickle( data_path )
+
+
+def load_columns( loc, year, data_path=None, store_path=STORE_PATH ):
+    # Like load_table, but as a dictionary of arrays (dates as datetime64),
+    # which needs neither pandas nor a copy when the store has the data.
+    store = open_store( store_path )
+    if store is not None and (loc, year) in store:
+        return store.columns( loc, year )
+
+    data_table = load_table( loc, year, data_path, store_path )
+    columns = { 'date': np.asarray( data_table['date'], dtype='datetime64[D]' ) }
+    for name in col_names[1:]:
+        columns[name] = np.asarray( data_table[name], dtype=float )
+    return columns
+
+
+if __name__ == '__main__':
+
+    import pandas as pd
+
+    store = SunStore( STORE_PATH )
+
+    for data_path in sys.argv[1:]:
+        if data_path == '--compact':
+            print( 'Removing %d unused rows' % store.unused_rows() )
+            store.compact()
+            continue
+        # '[PLACE_NAME][YEAR].pkl' or '[PLACE_NAME][YEAR]-[LAST_YEAR].pkl'
+        loc = re.match( r'(.*?)\d{4}(-\d{4})?\.pkl$', os.path.basename(data_path) ).group(1)
+        print( 'Adding %s as %s' % (data_path, loc) )
+        store.add( loc, pd.read_pickle(data_path) )
@@ -1,11 +1,14 @@
 
 import sys
 
-import pandas as pd
 import matplotlib.pyplot as plt
-import matplotlib.ticker as ticker
 import numpy as np
-from datetime import date, time, timedelta
+from datetime import time
+
+from sun_store import load_table
+from clock_policy import ClockPolicy, UTC
+from daylight_core import sunny_mornings_by_month, table_mornings
+from figure_templates import StackedBarTemplate, cached_template
 
 
 # -----------------------------------------
@@ -21,13 +24,16 @@ LOCNAME = r' í Reykjavík'
 # LOCNAME = r' í Ponta Delgada'
 YEAR = 2018
 DATA_PATH = '%s%d.pkl' %(LOC,YEAR)
+# The data is read from the columnar store (see sun_store.py)
+# if it has LOC and YEAR, otherwise from DATA_PATH.
+STORE_PATH = 'sun_store'
 
 # Offset in hours from UTC in winter.
 UTC_OFFSET = -1
 
-# In 2018, DST starts on March 25 and ends October 28
-DST_START_DATE = date(YEAR,3,25)
-DST_END_DATE = date(YEAR,10,28)
+# DST on the same days as in this time zone
+# (in 2018, from March 25 to October 28)
+DST_ZONE = 'Europe/London'
 
 
 plt.rc('font', family='Times New Roman')
@@ -67,61 +73,46 @@ def sunny_morning_plot_config( ax ):
 
 
 
-def sunny_mornings_by_month( data, wake_time ):
-    # wake_time in seconds
-
-    dates = data['date']
-    year = dates[0].year
-
-    days_in_year = len(dates)
-    seconds_in_day = 24*60*60
-    ind = np.arange(days_in_year)
-
-    sun_does_not_set = ind[data['sunset'] < -seconds_in_day]
-    twilight_does_not_end = ind[data['twilight_end'] < -seconds_in_day]
-
-    is_it_already = (wake_time >= data.iloc[:,1:])
-
-    is_it_already['sunset'].iloc[sun_does_not_set] = False
-    is_it_already['twilight_end'].iloc[twilight_does_not_end] = False
-
-    sunny = is_it_already['sunrise'] * (1-is_it_already['sunset'])
-
-    twilight = is_it_already['twilight_begin']  \
-                * (1-is_it_already['twilight_end']) \
-                * (1-sunny)
-
-    first_day_of_months = [date(year,month,1) for month in range(1,13)]
-    month_indices = dates.searchsorted(first_day_of_months)
-    # convenience:
-    month_indices = np.append(month_indices, None)
-
-    sunny_mornings = np.zeros(12)
-    twilight_mornings = np.zeros(12)
+def sunny_morning_template( plot_colors ):
+    # Bars of the days in each month, and of sunny and twilight mornings
+    # in UTC, shift, DST, built once (see figure_templates.py)
+    barwidth = 0.25
+    # barwidth = 0.375
+    # background_barcolor = '#eaeeff'
+    background_barcolor = plot_colors[2]
 
-    for month in range(12):
-        month_start = month_indices[month]
-        month_end = month_indices[month+1]
+    # twi_barcolor = '#106ebc'
+    # day_barcolor = '#c6e5ff'
 
-        sunny_mornings[month] = sunny.iloc[month_start:month_end].sum()
-        twilight_mornings[month] = twilight.iloc[month_start:month_end].sum()
+    twi_barcolor = plot_colors[1]
+    day_barcolor = plot_colors[0]
 
-    return sunny_mornings, twilight_mornings
+    template = StackedBarTemplate( [ ( np.arange(12), 3*barwidth, [background_barcolor], [r'Dagar í mánuði'] ),
+                                     ( np.arange(12)-barwidth, barwidth, [day_barcolor, twi_barcolor], [None, None] ),
+                                     ( np.arange(12), barwidth, [day_barcolor, twi_barcolor], [r'Sólarljós', r'Ljósaskipti'] ),
+                                     ( np.arange(12)+barwidth, barwidth, [day_barcolor, twi_barcolor], [None, None] ) ] )
+    template.ax.set_ylabel('dagar')
+    return template
 
 
-def make_sunny_morning_plot( wake_time, loc_short, location_name, year, fig_dpi, plot_colors, utc_data, shift_data, dst_data ):
+def make_sunny_morning_plot( wake_time, loc_short, location_name, year, fig_dpi, plot_colors, utc_data, policies, tables=None ):
+    # policies: the clock policies UTC, shift, DST
+    # tables: sunny_mornings_table of each policy (optional), to look the counts up in
     # -----------------------------------------
     # -------------- COUNT DAYS ---------------
     # -----------------------------------------
 
-    number_of_days = len(utc_data)
+    number_of_days = len(utc_data['date'])
     is_leap_year = (number_of_days == 366)
 
     wake_seconds = wake_time.second+60*wake_time.minute+3600*wake_time.hour
 
-    utcSunMorn, utcTwiMorn = sunny_mornings_by_month( utc_data, wake_seconds )
-    shiftSunMorn, shiftTwiMorn = sunny_mornings_by_month( shift_data, wake_seconds )
-    dstSunMorn, dstTwiMorn = sunny_mornings_by_month( dst_data, wake_seconds )
+    if tables is not None and wake_seconds % ( 24*60*60 // len( tables[0][0] ) ) == 0:
+        mornings = [ table_mornings( policy_tables, wake_seconds ) for policy_tables in tables ]
+    else:
+        mornings = [ sunny_mornings_by_month( utc_data, wake_seconds, policy ) for policy in policies ]
+
+    (utcSunMorn, utcTwiMorn), (shiftSunMorn, shiftTwiMorn), (dstSunMorn, dstTwiMorn) = mornings
 
     # -----------------------------------------
     # ------------- PRINT TABLE ---------------
@@ -146,83 +137,14 @@ def make_sunny_morning_plot( wake_time, loc_short, location_name, year, fig_dpi,
     # -------------- PLOT ---------------------
     # -----------------------------------------
 
-    barwidth = 0.25
-    # barwidth = 0.375
-    # background_barcolor = '#eaeeff'
-    background_barcolor = plot_colors[2]
-
-    baredge = '#ffffff'
-
-    # twi_barcolor = '#106ebc'
-    # day_barcolor = '#c6e5ff'
-
-
-    twi_barcolor = plot_colors[1]
-    day_barcolor = plot_colors[0]
-
-    fig = plt.figure(figsize=(6,4))
-    ax = fig.add_subplot(1,1,1)
+    template = cached_template( ('sunnymornings', tuple(plot_colors)), lambda: sunny_morning_template( plot_colors ) )
 
-    # background bars
     month_days = [31,28+is_leap_year,31,30,31,30,31,31,30,31,30,31]
-    ax.bar( np.arange(12),
-            month_days,
-            width=3*barwidth,
-            # width=2*barwidth,
-            color=background_barcolor,
-            edgecolor=baredge,
-            label=r'Dagar í mánuði')
-
-
-    ax.bar( np.arange(12)-barwidth,
-            utcSunMorn,
-            width=barwidth,
-            color=day_barcolor,
-            edgecolor=baredge)
-    ax.bar( np.arange(12)-barwidth,
-            utcTwiMorn,
-            bottom=utcSunMorn,
-            width=barwidth,
-            color=twi_barcolor,
-            edgecolor=baredge)
-
-
-
-
-    ax.bar(
-            np.arange(12),
-            # np.arange(12)-barwidth/2,
-            shiftSunMorn,
-            width=barwidth,
-            color=day_barcolor,
-            edgecolor=baredge,
-            label=r'Sólarljós')
-    ax.bar(
-            np.arange(12),
-            # np.arange(12)-barwidth/2,
-            shiftTwiMorn,
-            bottom=shiftSunMorn,
-            width=barwidth,
-            color=twi_barcolor,
-            edgecolor=baredge,
-            label=r'Ljósaskipti')
-
-
-    ax.bar(
-            np.arange(12)+barwidth,
-            # np.arange(12)+barwidth/2,
-            dstSunMorn,
-            width=barwidth,
-            color=day_barcolor,
-            edgecolor=baredge)
-    ax.bar(
-            np.arange(12)+barwidth,
-            # np.arange(12)+barwidth/2,
-            dstTwiMorn,
-            bottom=dstSunMorn,
-            width=barwidth,
-            color=twi_barcolor,
-            edgecolor=baredge)
+    template.update( [ [month_days],
+                       [utcSunMorn, utcTwiMorn],
+                       [shiftSunMorn, shiftTwiMorn],
+                       [dstSunMorn, dstTwiMorn] ] )
+    ax = template.ax
 
     sunny_morning_plot_config(ax)
 
@@ -232,10 +154,8 @@ def make_sunny_morning_plot( wake_time, loc_short, location_name, year, fig_dpi,
 
     ax.set_title('Dagsbirta kl. '+wakestring+locstring)
 
-    ax.set_ylabel('dagar')
-
     wakestring = wake_time.strftime('%H%M')
-    plt.savefig('%s%d-sunnymornings-%s.png'%(loc_short,year,wakestring),dpi=fig_dpi,bbox_inches='tight')
+    template.save('%s%d-sunnymornings-%s.png'%(loc_short,year,wakestring),fig_dpi)
     # plt.show()
 
     return stats
@@ -261,29 +181,24 @@ if __name__ == '__main__':
     # -----------------------------------------
 
 
-    utc_data = pd.read_pickle(DATA_PATH)
+    utc_data = load_table( LOC, YEAR, DATA_PATH, STORE_PATH )
 
     dates = utc_data['date']
 
 
-    # Move the data from UTC to local time zone.
+    # Clocks in UTC, shifted to the local time zone, and with DST
     # time shift in seconds
     shift = UTC_OFFSET*60*60
 
-    shift_data = utc_data.copy()
-    shift_data.iloc[:,1:] += shift
-
-
-    dst_start_ind, dst_end_ind = dates.searchsorted([DST_START_DATE,DST_END_DATE])
-
-    dst_data = shift_data.copy()
-    dst_data.iloc[ dst_start_ind : dst_end_ind , 1: ] += 60*60
+    shift_policy = ClockPolicy( shift )
+    dst_policy = ClockPolicy.with_zone_dst( shift, dates, DST_ZONE )
+    policies = [ UTC, shift_policy, dst_policy ]
 
     # -----------------------------------------
     # ------------- MAKE PLOT -----------------
     # -----------------------------------------
 
-    make_sunny_morning_plot( WAKE_TIME, LOC, LOCNAME, YEAR, DPI, PLOT_COLORS, utc_data, shift_data, dst_data )
+    make_sunny_morning_plot( WAKE_TIME, LOC, LOCNAME, YEAR, DPI, PLOT_COLORS, utc_data, policies )
 
     plt.clf()
     plt.close()
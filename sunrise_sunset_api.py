@@ -0,0 +1,176 @@
+
+# Fetch data from https://sunrise-sunset.org/ concurrently.
+
+# Each worker thread keeps one keep-alive connection to the server
+# and reuses it for all of its requests.
+# The number of simultaneous requests and the rate of requests
+# are limited, and failed requests are retried with exponential backoff.
+# API_URL can point to any server that answers like the real API,
+# e.g. a local stand-in server for testing.
+# With a cache (see response_cache.py) every response is saved
+# as soon as it arrives, and cached days are not requested again.
+
+import json
+import threading
+import time
+import http.client
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+
+API_URL = 'https://api.sunrise-sunset.org/json'
+
+CONCURRENCY = 8
+# Requests per second, None for no limit
+RATE_LIMIT = 20
+RETRIES = 4
+BACKOFF = 0.5
+TIMEOUT = 30
+
+
+def request_query( lat, lng, day ):
+    # The query string of the request for one day (also the key of its cached response)
+    return 'lat=%f&lng=%f&date=%s&formatted=0' % (lat, lng, day)
+
+
+class RateLimiter:
+    # Spaces out calls to wait() so that at most rate of them
+    # pass per second, shared by all threads.
+
+    def __init__( self, rate ):
+        self.interval = 0 if not rate else 1/rate
+        self.next_time = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait( self ):
+        if self.interval == 0:
+            return
+        with self.lock:
+            now = time.monotonic()
+            wait_until = max( now, self.next_time )
+            self.next_time = wait_until + self.interval
+        time.sleep( max( 0, wait_until - now ) )
+
+
+class RetryableError(Exception):
+    pass
+
+
+class ApiError(Exception):
+    pass
+
+
+# Connection failures and timeouts (OSError), overloaded server (RetryableError)
+RETRYABLE_ERRORS = (RetryableError, OSError, http.client.BadStatusLine, http.client.IncompleteRead)
+
+
+class ApiFetcher:
+
+    def __init__( self, api_url=API_URL, concurrency=CONCURRENCY, rate_limit=RATE_LIMIT,
+                  retries=RETRIES, backoff=BACKOFF, timeout=TIMEOUT, cache=None ):
+
+        url = urllib.parse.urlsplit( api_url )
+        self.scheme = url.scheme
+        self.host = url.netloc
+        self.path = url.path or '/'
+
+        self.concurrency = concurrency
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.cache = cache
+
+        self.limiter = RateLimiter( rate_limit )
+        self.local = threading.local()
+        self.connections = []
+        self.connections_lock = threading.Lock()
+
+    def _connection( self ):
+        conn = getattr( self.local, 'conn', None )
+        if conn is None:
+            if self.scheme == 'https':
+                conn = http.client.HTTPSConnection( self.host, timeout=self.timeout )
+            else:
+                conn = http.client.HTTPConnection( self.host, timeout=self.timeout )
+            self.local.conn = conn
+            with self.connections_lock:
+                self.connections.append( conn )
+        return conn
+
+    def _drop_connection( self ):
+        conn = getattr( self.local, 'conn', None )
+        if conn is not None:
+            conn.close()
+            self.local.conn = None
+
+    def request_path( self, lat, lng, day ):
+        return self.path + '?' + request_query( lat, lng, day )
+
+    def _get( self, path ):
+        conn = self._connection()
+        conn.request( 'GET', path, headers={'Connection': 'keep-alive'} )
+        response = conn.getresponse()
+        body = response.read()
+
+        if response.status == 429 or response.status >= 500:
+            raise RetryableError( 'HTTP %d' % response.status )
+        if response.status != 200:
+            raise ApiError( 'HTTP %d for %s' % (response.status, path) )
+        if response.will_close:
+            self._drop_connection()
+
+        return json.loads( body )
+
+    def fetch_day( self, lat, lng, day ):
+        # The 'results' of the API for one day (datetime.date or 'YYYY-MM-DD')
+        if self.cache is not None:
+            results = self.cache.get( lat, lng, day )
+            if results is not None:
+                return results
+
+        path = self.request_path( lat, lng, day )
+
+        for attempt in range( self.retries + 1 ):
+            self.limiter.wait()
+            try:
+                date_data = self._get( path )
+            except RETRYABLE_ERRORS as error:
+                # A broken keep-alive connection is opened again on the next try
+                if not isinstance( error, RetryableError ):
+                    self._drop_connection()
+                if attempt == self.retries:
+                    raise
+                time.sleep( self.backoff * 2**attempt )
+                continue
+
+            if date_data.get( 'status', 'OK' ) != 'OK':
+                raise ApiError( 'API status %s for %s' % (date_data['status'], path) )
+
+            if self.cache is not None:
+                self.cache.put( lat, lng, day, date_data['results'] )
+            return date_data['results']
+
+    def fetch_days( self, lat, lng, days, progress=False ):
+        # List of 'results', in the same order as days
+
+        def fetch( day ):
+            results = self.fetch_day( lat, lng, day )
+            if progress:
+                print( '.', end = '', flush = True )
+            return results
+
+        try:
+            with ThreadPoolExecutor( max_workers=self.concurrency ) as pool:
+                return list( pool.map( fetch, days ) )
+        finally:
+            self.close()
+
+    def close( self ):
+        with self.connections_lock:
+            for conn in self.connections:
+                conn.close()
+            self.connections = []
+
+
+def fetch_days( lat, lng, days, progress=False, **options ):
+    return ApiFetcher( **options ).fetch_days( lat, lng, days, progress )
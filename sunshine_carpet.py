@@ -1,12 +1,16 @@
 
 import sys
 
-import pandas as pd
 import matplotlib.pyplot as plt
 import matplotlib.ticker as ticker
 from matplotlib import colors  
 import numpy as np
-from datetime import date, time, timedelta
+from datetime import time
+
+from sun_store import load_table
+from clock_policy import ClockPolicy
+from daylight_core import weave_carpet, carpet_pieces
+from instrument import stage
 
 
 # -----------------------------------------
@@ -23,13 +27,16 @@ LOCNAME = r' í Reykjavík'
 # LOCNAME = r' í Ponta Delgada'
 YEAR = 2018
 DATA_PATH = '%s%d.pkl' %(LOC,YEAR)
+# The data is read from the columnar store (see sun_store.py)
+# if it has LOC and YEAR, otherwise from DATA_PATH.
+STORE_PATH = 'sun_store'
 
 # Offset in hours from UTC in winter.
 UTC_OFFSET = -1
 
-# In 2018, DST starts on March 25 and ends October 28
-DST_START_DATE = date(YEAR,3,25)
-DST_END_DATE = date(YEAR,10,28)
+# DST on the same days as in this time zone
+# (in 2018, from March 25 to October 28)
+DST_ZONE = 'Europe/London'
 
 plt.rc('font', family='Times New Roman')
 DPI = 150
@@ -80,99 +87,39 @@ def sunshine_carpet_plot_config( ax, is_leap_year=False ):
 
 
 
-def weave_carpet( data ):
-    
-    night_code = 0
-    twi_code = 1
-    day_code = 2
-
-    # Resolution in minutes
-    minutes_in_day = 60*24
-    days_in_year = data.shape[0]
-
-    thread = night_code*np.ones( days_in_year * minutes_in_day )
-
-    twi_begin = (data[ 'twilight_begin' ]/60).round().astype(int)
-    sunrise = (data[ 'sunrise' ]/60).round().astype(int)
-    sunset = (data[ 'sunset' ]/60).round().astype(int)
-    twi_end = (data[ 'twilight_end' ]/60).round().astype(int)
-
-    # Paint twilight
-    for day in range(days_in_year)[::-1]:
-        t0 = day*minutes_in_day
-
-        tl2 = twi_end[day]
-        if tl2 < - minutes_in_day:
-            # last t1
-            t2 = t1
-        else:
-            t2 = t0 + tl2
-
-        tl1 = twi_begin[day]
-        if tl1 < - minutes_in_day:
-            # next t2
-            if day > 0:
-                tl2 = twi_end[day-1]
-            else:
-                tl2 = 0
-            if tl2 < - minutes_in_day:
-                t1 = t0 - minutes_in_day
-            else:
-                t1 = t0 - minutes_in_day + tl2
-        else:
-            t1 = t0 + tl1
-
-        thread[t1:t2] = twi_code
-
-    # Paint sunlight
-    for day in range(days_in_year)[::-1]:
-        t0 = day*minutes_in_day
-
-        sl2 = sunset[day]
-        if sl2 < - minutes_in_day:
-            t2 = t1
-        else:
-            t2 = t0 + sl2
-
-        sl1 = sunrise[day]
-        if sl1 < - minutes_in_day:
-            # next t2
-            if day > 0:
-                sl2 = sunset[day-1]
-            else:
-                sl2 = 0
-            if sl2 < - minutes_in_day:
-                t1 = t0 - minutes_in_day
-            else:
-                t1 = t0 - minutes_in_day + sl2
-        else:
-            t1 = t0 + sl1
-
-        thread[t1:t2] = day_code
-
-    carpet = thread.reshape(( days_in_year, minutes_in_day )).T
-    return carpet
-
-
-
-def make_sunshine_carpet_plot( wake_time, sleep_time, loc_short, location_name, year, fig_dpi, plot_colors, utc_data, utc_offset, dst_start_date, dst_end_date ):
+def show_carpet( ax, pieces, carpet_cmap ):
+    # imshow of the pieces of a carpet side by side
+    for day1, part in pieces:
+        minutes_in_day, days = part.shape
+        ax.imshow( part, cmap=carpet_cmap, vmin=0, vmax=2, origin='lower', interpolation='none', aspect='auto',
+                   extent=( day1-0.5, day1+days-0.5, -0.5, minutes_in_day-0.5 ) )
 
-    utcCarpet = weave_carpet( utc_data )
+    ax.set_xlim( -0.5, pieces[-1][0] + pieces[-1][1].shape[1] - 0.5 )
+    ax.set_ylim( -0.5, minutes_in_day-0.5 )
 
-    shift = utc_offset * 60
 
-    thread = np.roll( utcCarpet.ravel( order='F' ), shift )
-    shiftCarpet = thread.reshape( utcCarpet.shape, order='F' ).copy()
+def plot_noon( ax, noon_minutes, policy, noon_color ):
+    # The noon line in the time of the clock policy,
+    # broken where the offset changes.
+    number_of_days = len(noon_minutes)
+    offsets = policy.minute_offsets( number_of_days )
 
+    breaks = np.flatnonzero( np.diff(offsets) ) + 1
+    for day1, day2 in zip( np.append(0, breaks), np.append(breaks, number_of_days) ):
+        days = np.arange( day1, day2 )
+        ax.plot( days, offsets[day1:day2] + noon_minutes[day1:day2], noon_color )
 
-    dates = utc_data['date']
-    dst_start_ind, dst_end_ind = dates.searchsorted([dst_start_date,dst_end_date])
 
-    ind1 = dst_start_ind * 60*24
-    ind2 = dst_end_ind * 60*24
+def make_sunshine_carpet_plot( wake_time, sleep_time, loc_short, location_name, year, fig_dpi, plot_colors, utc_data, shift_policy, dst_policy ):
 
-    thread[ind1:ind2] = thread[ ind1-60 : ind2-60 ]
-    dstCarpet = thread.reshape( utcCarpet.shape, order='F' )
+    utcCarpet = weave_carpet( utc_data )
+
+    # Views into utcCarpet, not copies
+    shiftCarpet = carpet_pieces( utcCarpet, shift_policy )
+    dstCarpet = carpet_pieces( utcCarpet, dst_policy )
+
+    dates = utc_data['date']
+    noon_minutes = np.asarray( utc_data['noon'], dtype=float )/60
 
 
     # -----------------------------------------
@@ -206,10 +153,10 @@ def make_sunshine_carpet_plot( wake_time, sleep_time, loc_short, location_name,
     fig = plt.figure(figsize=(9,4))
 
     ax = fig.add_subplot(1,1,1)
-    ax.imshow( utcCarpet, cmap=carpet_cmap, origin='lower', interpolation='none', aspect='auto' )
+    show_carpet( ax, [ (0, utcCarpet) ], carpet_cmap )
 
 
-    ax.plot( utc_data['noon']/60, noon_color )
+    ax.plot( noon_minutes, noon_color )
 
     number_of_days = len(dates)
     ax.plot( [0,number_of_days-1], wake_minutes*np.ones(2), color=sleep_color, linestyle=sleep_style )
@@ -222,7 +169,8 @@ def make_sunshine_carpet_plot( wake_time, sleep_time, loc_short, location_name,
 
     ax.set_title(str1+str2)
 
-    plt.savefig('%s%d-carpet-utc.png'%(loc_short,year),dpi=fig_dpi,bbox_inches='tight')
+    with stage( 'savefig' ):
+        plt.savefig('%s%d-carpet-utc.png'%(loc_short,year),dpi=fig_dpi,bbox_inches='tight')
     # plt.show()
 
     # -----------------------------------------
@@ -231,10 +179,10 @@ def make_sunshine_carpet_plot( wake_time, sleep_time, loc_short, location_name,
     fig = plt.figure(figsize=(9,4))
 
     ax = fig.add_subplot(1,1,1)
-    ax.imshow( shiftCarpet, cmap=carpet_cmap, origin='lower', interpolation='none', aspect='auto' )
+    show_carpet( ax, shiftCarpet, carpet_cmap )
 
 
-    ax.plot( shift+utc_data['noon']/60, noon_color )
+    plot_noon( ax, noon_minutes, shift_policy, noon_color )
 
     ax.plot( [0,number_of_days-1], wake_minutes*np.ones(2), color=sleep_color, linestyle=sleep_style )
     ax.plot( [0,number_of_days-1], sleep_minutes*np.ones(2), color=sleep_color, linestyle=sleep_style )
@@ -243,11 +191,12 @@ def make_sunshine_carpet_plot( wake_time, sleep_time, loc_short, location_name,
 
 
 
-    str3 = '%+d' % utc_offset
+    str3 = '%+g' % (shift_policy.utc_offset/3600)
     ax.set_title(str1+str2+str3)
 
 
-    plt.savefig('%s%d-carpet-shift.png'%(loc_short,year),dpi=fig_dpi,bbox_inches='tight')
+    with stage( 'savefig' ):
+        plt.savefig('%s%d-carpet-shift.png'%(loc_short,year),dpi=fig_dpi,bbox_inches='tight')
     # plt.show()
 
     # -----------------------------------------
@@ -256,11 +205,9 @@ def make_sunshine_carpet_plot( wake_time, sleep_time, loc_short, location_name,
     fig = plt.figure(figsize=(9,4))
 
     ax = fig.add_subplot(1,1,1)
-    ax.imshow( dstCarpet, cmap=carpet_cmap, origin='lower', interpolation='none', aspect='auto' )
+    show_carpet( ax, dstCarpet, carpet_cmap )
 
-    ax.plot( 60 + shift + utc_data['noon'][dst_start_ind:dst_end_ind]/60, noon_color )
-    ax.plot( shift + utc_data['noon'][:dst_start_ind]/60, noon_color )
-    ax.plot( shift + utc_data['noon'][dst_end_ind:]/60, noon_color )
+    plot_noon( ax, noon_minutes, dst_policy, noon_color )
 
     ax.plot( [0,number_of_days-1], wake_minutes*np.ones(2), color=sleep_color, linestyle=sleep_style )
     ax.plot( [0,number_of_days-1], sleep_minutes*np.ones(2), color=sleep_color, linestyle=sleep_style )
@@ -271,7 +218,8 @@ def make_sunshine_carpet_plot( wake_time, sleep_time, loc_short, location_name,
     str4 = r' með sumartíma'
     ax.set_title(str1+str2+str3+str4)
 
-    plt.savefig('%s%d-carpet-dst.png'%(loc_short,year),dpi=fig_dpi,bbox_inches='tight')
+    with stage( 'savefig' ):
+        plt.savefig('%s%d-carpet-dst.png'%(loc_short,year),dpi=fig_dpi,bbox_inches='tight')
     # plt.show()
 
 
@@ -302,14 +250,17 @@ if __name__ == '__main__':
     # -----------------------------------------
 
 
-    utc_data = pd.read_pickle(DATA_PATH)
+    utc_data = load_table( LOC, YEAR, DATA_PATH, STORE_PATH )
 
 
     # -----------------------------------------
     # ------------- MAKE PLOT -----------------
     # -----------------------------------------
 
-    make_sunshine_carpet_plot( WAKE_TIME, SLEEP_TIME, LOC, LOCNAME, YEAR, DPI, PLOT_COLORS, utc_data, UTC_OFFSET, DST_START_DATE, DST_END_DATE )
+    shift_policy = ClockPolicy( UTC_OFFSET*60*60 )
+    dst_policy = ClockPolicy.with_zone_dst( UTC_OFFSET*60*60, utc_data['date'], DST_ZONE )
+
+    make_sunshine_carpet_plot( WAKE_TIME, SLEEP_TIME, LOC, LOCNAME, YEAR, DPI, PLOT_COLORS, utc_data, shift_policy, dst_policy )
 
     plt.clf()
     plt.close()
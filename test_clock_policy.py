@@ -0,0 +1,64 @@
+
+# Tests of clock policies from IANA time zones (clock_policy.py, time_zones.py).
+#
+# Usage:
+# python3 -m pytest test_clock_policy.py
+
+import unittest
+from datetime import datetime, time, timezone
+from zoneinfo import ZoneInfo
+
+import numpy as np
+
+import time_zones
+from clock_policy import ClockPolicy
+
+
+dates_2018 = np.arange( np.datetime64('2018-01-01'), np.datetime64('2019-01-01') )
+# DST in Europe in 2018, from March 25 to October 28
+summer_2018 = ( dates_2018 >= np.datetime64('2018-03-25') ) & ( dates_2018 < np.datetime64('2018-10-28') )
+
+
+class ZoneDstTest( unittest.TestCase ):
+
+    def test_london( self ):
+        policy = ClockPolicy.with_zone_dst( -3600, dates_2018, 'Europe/London' )
+        self.assertTrue( np.array_equal( policy.dst_minutes, 60*summer_2018 ) )
+        self.assertTrue( np.array_equal( policy.offsets(), -3600 + 3600*summer_2018 ) )
+
+    def test_dublin( self ):
+        # zoneinfo gives Dublin negative DST in winter (summer time is its
+        # standard time); DST must still move the clock forward in summer
+        self.assertTrue( np.array_equal( time_zones.dst_offsets( 'Europe/Dublin', dates_2018 ), 3600*summer_2018 ) )
+
+        policy = ClockPolicy.with_zone_dst( -3600, dates_2018, 'Europe/Dublin' )
+        self.assertTrue( np.array_equal( policy.dst_minutes, 60*summer_2018 ) )
+
+        zone = ClockPolicy.from_zone( 'Europe/Dublin', dates_2018 )
+        self.assertEqual( zone.utc_offset, 0 )
+        self.assertTrue( np.array_equal( zone.offsets(), time_zones.utc_offsets( 'Europe/Dublin', dates_2018 ) ) )
+        self.assertTrue( np.array_equal( zone.offsets(), 3600*summer_2018 ) )
+
+    def test_southern_hemisphere( self ):
+        # DST in the southern summer, at the ends of the year
+        dst = time_zones.dst_offsets( 'America/Santiago', dates_2018 )
+        self.assertEqual( dst[0], 3600 )
+        self.assertEqual( dst[180], 0 )
+        self.assertGreaterEqual( dst.min(), 0 )
+
+    def test_every_day( self ):
+        # The offset of each day is that of the zone at noon (UTC)
+        for zone_name in [ 'Europe/London', 'America/Santiago', 'Africa/Casablanca' ]:
+            zone = ZoneInfo( zone_name )
+            dates = np.arange( np.datetime64('2012-01-01'), np.datetime64('2020-01-01') )
+            expected = [ datetime.combine( day.item(), time(12), timezone.utc ).astimezone( zone ).utcoffset().total_seconds()
+                         for day in dates ]
+            with self.subTest( zone=zone_name ):
+                self.assertTrue( np.array_equal( time_zones.utc_offsets( zone_name, dates ), expected ) )
+
+    def test_no_dst( self ):
+        self.assertFalse( ClockPolicy.with_zone_dst( 0, dates_2018, 'Atlantic/Reykjavik' ).has_dst() )
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,222 @@
+
+# Tests of the vectorized kernels (daylight_core.py, daylight_index.py)
+# against the code they replaced.
+
+# baseline_average_daylight and baseline_sunny_mornings are the loops of
+# hours_of_daylight.py and sunny_mornings.py before the kernels, run on
+# shifted copies of the data as the plots made them for each clock.
+# The data is from solar_ephemeris.py: Tromsø in 2018 (midnight sun
+# and polar night) and Lisbon in the leap year 2020.
+#
+# Usage:
+# python3 -m pytest test_daylight_kernels.py
+
+import unittest
+from datetime import date, timedelta
+
+import numpy as np
+
+import solar_ephemeris
+from clock_policy import UTC, ClockPolicy
+from daylight_core import average_daylight_by_month, average_daylight_sweep, \
+                          sunny_mornings_by_month, sunny_mornings_table, table_mornings, weave_carpet
+from daylight_index import DaylightIndex
+
+
+seconds_in_day = 24*60*60
+
+
+def baseline_average_daylight( data, start_time=0, stop_time=24*60*60 ):
+    dates = data['date']
+
+    # Seperately treat the hours before and after midnight
+    if stop_time > seconds_in_day:
+        sunlight_hours, twilight_hours = baseline_average_daylight( data, start_time, seconds_in_day )
+
+        shifted_data = data.copy()
+        shifted_data['date'] = dates - timedelta(1)
+        res_sun, res_twi = baseline_average_daylight( shifted_data, 0, stop_time - seconds_in_day )
+
+        return sunlight_hours + res_sun, twilight_hours + res_twi
+
+    sunrise = data['sunrise']
+    sunset = data['sunset'].copy()
+    twibegin = data['twilight_begin']
+    twiend = data['twilight_end'].copy()
+
+    twiend[ twiend<-seconds_in_day ] = stop_time
+    sunset[ sunset<-seconds_in_day ] = np.inf
+
+    last_sunset = sunset - seconds_in_day
+    last_twiend = twiend - seconds_in_day
+
+    sunrise = sunrise.clip( start_time, stop_time )
+    sunset = sunset.clip( start_time, stop_time )
+    last_sunset = last_sunset.clip( start_time, sunrise )
+    last_twiend = last_twiend.clip( last_sunset, stop_time )
+    twibegin = twibegin.clip( last_twiend, stop_time )
+    twiend = twiend.clip( start_time, stop_time )
+
+    sunlight = last_sunset - start_time + sunset - sunrise
+    twilight = last_twiend - last_sunset + sunrise - twibegin + twiend - sunset
+
+    year = dates[ len(dates) // 2 ].year
+    month_indices = np.append( dates.searchsorted( [ date(year,month,1) for month in range(1,13) ] ), None )
+
+    sunlight_hours = np.zeros(12)
+    twilight_hours = np.zeros(12)
+    for month in range(12):
+        sunlight_hours[month] = sunlight.iloc[ month_indices[month]:month_indices[month+1] ].mean()/3600
+        twilight_hours[month] = twilight.iloc[ month_indices[month]:month_indices[month+1] ].mean()/3600
+
+    return sunlight_hours, twilight_hours
+
+
+def baseline_sunny_mornings( data, wake_time ):
+    dates = data['date']
+    year = dates[0].year
+
+    is_it_already = ( wake_time >= data.iloc[:,1:] )
+    is_it_already.loc[ data['sunset'] < -seconds_in_day, 'sunset' ] = False
+    is_it_already.loc[ data['twilight_end'] < -seconds_in_day, 'twilight_end' ] = False
+
+    sunny = is_it_already['sunrise'] * (1-is_it_already['sunset'])
+    twilight = is_it_already['twilight_begin'] * (1-is_it_already['twilight_end']) * (1-sunny)
+
+    month_indices = np.append( dates.searchsorted( [ date(year,month,1) for month in range(1,13) ] ), None )
+
+    sunny_mornings = np.zeros(12)
+    twilight_mornings = np.zeros(12)
+    for month in range(12):
+        sunny_mornings[month] = sunny.iloc[ month_indices[month]:month_indices[month+1] ].sum()
+        twilight_mornings[month] = twilight.iloc[ month_indices[month]:month_indices[month+1] ].sum()
+
+    return sunny_mornings, twilight_mornings
+
+
+def shifted( data, policy ):
+    # The data in the time of the clock, as the plots shifted it
+    shift_data = data.copy()
+    for name in data.columns[1:]:
+        shift_data[name] = shift_data[name] + policy.offsets( len(data) )
+    return shift_data
+
+
+def clock_policies( dates ):
+    return [ UTC, ClockPolicy( -3600 ), ClockPolicy( 3600 ),
+             ClockPolicy.with_dst( -3600, dates, date(dates[0].year,3,25), date(dates[0].year,10,28) ) ]
+
+
+class KernelTest( unittest.TestCase ):
+
+    def setUp( self ):
+        self.datasets = { 'Tromsø 2018': solar_ephemeris.year_table( 69.65, 18.96, 2018 ),
+                          'Lisbon 2020': solar_ephemeris.year_table( 38.72, -9.14, 2020 ) }
+
+    def test_average_daylight( self ):
+        # (wake, sleep) times, the last two past midnight
+        windows = [ (0, 24), (7, 23), (9, 15), (20, 30), (6, 24+6) ]
+        for name, data in self.datasets.items():
+            for policy in clock_policies( data['date'] ):
+                shift_data = shifted( data, policy )
+                for start, stop in windows:
+                    with self.subTest( data=name, policy=policy, window=(start, stop) ):
+                        expected = baseline_average_daylight( shift_data, start*3600, stop*3600 )
+                        result = average_daylight_by_month( data, start*3600, stop*3600, policy )
+                        # The baseline has no day after December 31 for the hours
+                        # after midnight; the kernel uses December 31 again
+                        months = slice( 0, 11 if stop > 24 else 12 )
+                        for expected_hours, hours in zip( expected, result ):
+                            self.assertTrue( np.allclose( hours[months], expected_hours[months] ) )
+
+    def test_average_daylight_sweep( self ):
+        start_times = np.array( [0, 7, 9, 20] )*3600
+        stop_times = np.array( [24, 23, 15, 30] )*3600
+        for name, data in self.datasets.items():
+            policies = clock_policies( data['date'] )
+            sunlight, twilight = average_daylight_sweep( data, start_times, stop_times, policies )
+            for i, (start, stop) in enumerate( zip( start_times, stop_times ) ):
+                for j, policy in enumerate( policies ):
+                    with self.subTest( data=name, policy=policy, window=(start, stop) ):
+                        expected = average_daylight_by_month( data, start, stop, policy )
+                        self.assertTrue( np.allclose( sunlight[i,j], expected[0] ) )
+                        self.assertTrue( np.allclose( twilight[i,j], expected[1] ) )
+
+    def test_sunny_mornings( self ):
+        for name, data in self.datasets.items():
+            for policy in clock_policies( data['date'] ):
+                shift_data = shifted( data, policy )
+                tables = sunny_mornings_table( data, policy )
+                for wake_time in range( 0, seconds_in_day, 20*60 ):
+                    with self.subTest( data=name, policy=policy, wake_time=wake_time ):
+                        expected = baseline_sunny_mornings( shift_data, wake_time )
+                        result = sunny_mornings_by_month( data, wake_time, policy )
+                        from_table = table_mornings( tables, wake_time )
+                        for expected_mornings, mornings, table_row in zip( expected, result, from_table ):
+                            self.assertTrue( np.array_equal( mornings, expected_mornings ) )
+                            self.assertTrue( np.array_equal( table_row, expected_mornings ) )
+
+
+def brute_force_query( carpet, start, stop, first_day, last_day, offset ):
+    # Count the minutes of the carpet in the window one by one
+    minutes_in_day, number_of_days = carpet.shape
+    if stop <= start:
+        stop += minutes_in_day
+    if last_day > first_day:
+        days = np.arange( first_day, last_day )
+    else:
+        days = np.append( np.arange( first_day, number_of_days ), np.arange( 0, last_day ) )
+
+    utc_minutes = ( days[:,None]*minutes_in_day + np.arange( start, stop ) - offset ).ravel()
+    utc_days, utc_minutes = utc_minutes // minutes_in_day, utc_minutes % minutes_in_day
+    inside = ( utc_days >= 0 ) & ( utc_days < number_of_days )
+    codes = carpet[ utc_minutes[inside], utc_days[inside] ]
+    return np.count_nonzero( codes == 2 ), np.count_nonzero( codes == 1 )
+
+
+class DaylightIndexTest( unittest.TestCase ):
+
+    def setUp( self ):
+        self.data = solar_ephemeris.year_table( 69.65, 18.96, 2018 )
+        self.carpet = weave_carpet( self.data )
+        self.index = DaylightIndex( self.carpet, self.data['date'] )
+
+    def assertQuery( self, start, stop, first_day, last_day, offset ):
+        expected = brute_force_query( self.carpet, start, stop, first_day, last_day, offset )
+        self.assertEqual( tuple( map( int, self.index.query( start, stop, first_day, last_day, offset ) ) ), expected )
+
+    def test_query( self ):
+        random = np.random.default_rng( 2018 )
+        for _ in range( 200 ):
+            start, stop = random.integers( 0, 1440, 2 )
+            first_day, last_day = random.integers( 0, 366, 2 )
+            offset = random.integers( -14*60, 14*60+1 )
+            with self.subTest( query=(start, stop, first_day, last_day, offset) ):
+                self.assertQuery( start, stop, first_day, last_day, offset )
+
+    def test_midnight_and_year_wrap( self ):
+        queries = [ (22*60, 2*60, 0, 365, 0),        # past midnight
+                    (23*60, 23*60, 10, 20, 0),       # the whole day, from 23:00
+                    (0, 1440, 0, 365, -300),         # into the day before the first
+                    (20*60, 6*60, 300, 40, 180),     # past midnight and the end of the year
+                    (7*60, 9*60, 364, 1, 600),       # December 31 only, moved into the next year
+                    (7*60, 9*60, 5, 5, 0) ]          # the whole year, from day 5
+        for query in queries:
+            with self.subTest( query=query ):
+                self.assertQuery( *query )
+
+    def test_policy_query( self ):
+        policy = clock_policies( self.data['date'] )[-1]
+        offsets = policy.minute_offsets( len( self.data ) )
+        for start, stop, first_day, last_day in [ (7*60, 9*60, 0, 365), (21*60, 3*60, 60, 120), (6*60, 8*60, 290, 90) ]:
+            with self.subTest( query=(start, stop, first_day, last_day) ):
+                days = np.arange( first_day, last_day ) if last_day > first_day \
+                       else np.append( np.arange( first_day, 365 ), np.arange( 0, last_day ) )
+                expected = np.sum( [ brute_force_query( self.carpet, start, stop, day, day+1, offsets[day] )
+                                     for day in days ], axis=0 )
+                result = self.index.policy_query( start, stop, first_day, last_day, policy )
+                self.assertEqual( tuple( map( int, result ) ), tuple( expected ) )
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+
+# Tests of the clock policy search (policy_search.py).
+#
+# Usage:
+# python3 -m pytest test_policy_search.py
+
+import unittest
+
+import numpy as np
+
+import solar_ephemeris
+from clock_policy import ClockPolicy
+from policy_search import search_policies, policy_score, dst_policy
+
+
+class SearchTest( unittest.TestCase ):
+
+    def setUp( self ):
+        self.data = solar_ephemeris.year_table( 64.13, -21.9, 2018 )
+        self.start_time, self.stop_time = 7*3600, 23*3600
+        self.offsets = np.arange( -2*60, 3*60 + 1, 15 ) * 60
+
+    def ranking( self, resolution ):
+        return search_policies( self.data, self.start_time, self.stop_time, self.offsets, top=10, resolution=resolution )
+
+    def test_scores( self ):
+        # The scores are those of the policies, best first
+        ranking = self.ranking( 1 )
+        for score, offset, dst_start, dst_end in ranking:
+            if dst_start is None:
+                policy = ClockPolicy( offset )
+            else:
+                policy = dst_policy( offset, dst_start, dst_end, len(self.data) )
+            self.assertAlmostEqual( score, policy_score( self.data, self.start_time, self.stop_time, policy ) )
+        scores = [ score for score, _, _, _ in ranking ]
+        self.assertEqual( scores, sorted( scores, reverse=True ) )
+
+    def test_distinct_policies( self ):
+        # Not the same DST moved by a day where it makes no difference
+        for resolution in (1, 3.6):
+            with self.subTest( resolution=resolution ):
+                ranking = self.ranking( resolution )
+                self.assertEqual( len(ranking), 10 )
+                self.assertEqual( len( { (offset, dst_start, dst_end) for _, offset, dst_start, dst_end in ranking } ), 10 )
+
+                plateaus = [ (offset, round( score/resolution )) for score, offset, dst_start, _ in ranking if dst_start is not None ]
+                self.assertEqual( len( set(plateaus) ), len(plateaus) )
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,137 @@
+
+# Tests of the columnar store (sun_store.py): adding, replacing and
+# compacting years, and adds that fail partway.
+#
+# Usage:
+# python3 -m pytest test_sun_store.py
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+
+import solar_ephemeris
+from sun_store import SunStore, col_names, col_dtypes
+
+
+def ephemeris_table( lat, lng, first_day, last_day ):
+    # Columns in the format of get_data.py, as a dictionary of arrays
+    days = solar_ephemeris.date_range( first_day, last_day )
+    data = solar_ephemeris.solar_events( lat, lng, days )
+    data['date'] = days
+    return data
+
+
+def file_rows( store, name ):
+    return os.path.getsize( store._column_path(name) ) // col_dtypes[name].itemsize
+
+
+class SunStoreTest( unittest.TestCase ):
+
+    def setUp( self ):
+        self.path = tempfile.mkdtemp()
+        self.store = SunStore( self.path )
+        self.rvk = ephemeris_table( 64.13, -21.9, '2017-01-01', '2018-12-31' )
+        self.tos = ephemeris_table( 69.65, 18.96, '2020-01-01', '2020-12-31' )
+
+    def tearDown( self ):
+        shutil.rmtree( self.path )
+
+    def assertYear( self, store, loc, year, table ):
+        columns = store.columns( loc, year )
+        rows = table['date'].astype('datetime64[Y]').astype(int) + 1970 == year
+        self.assertTrue( np.array_equal( columns['date'], table['date'][rows] ) )
+        expected = np.clip( np.round( table['sunrise'][rows] ), np.iinfo(np.int32).min, None )
+        self.assertTrue( np.array_equal( columns['sunrise'], expected ) )
+
+    def test_add( self ):
+        self.store.add( 'RVK', self.rvk, 64.13, -21.9, 'Atlantic/Reykjavik' )
+        self.store.add( 'TOS', self.tos )
+
+        store = SunStore( self.path )
+        self.assertEqual( store.years('RVK'), [2017, 2018] )
+        self.assertEqual( store.index['locations']['RVK']['time_zone'], 'Atlantic/Reykjavik' )
+        self.assertYear( store, 'RVK', 2017, self.rvk )
+        self.assertYear( store, 'RVK', 2018, self.rvk )
+        self.assertYear( store, 'TOS', 2020, self.tos )
+
+    def test_part_of_a_year_is_left_out( self ):
+        self.store.add( 'RVK', self.rvk )
+        # 2017-12-31 does not replace the whole of 2017
+        self.store.add( 'RVK', ephemeris_table( 64.13, -21.9, '2017-12-31', '2018-12-31' ) )
+        self.assertEqual( len( self.store.columns( 'RVK', 2017 )['date'] ), 365 )
+
+    def test_dates_not_consecutive( self ):
+        table = { name: np.delete( values, 40 ) for name, values in self.tos.items() }
+        with self.assertRaises( ValueError ):
+            self.store.add( 'TOS', table )
+
+    def test_failed_add( self ):
+        self.store.add( 'RVK', self.rvk, 64.13, -21.9 )
+        index = SunStore( self.path ).index
+
+        # The third column fails after the first two have been written
+        append_column = SunStore._append_column
+        def failing_append( store, name, values ):
+            if name == col_names[2]:
+                raise OSError( 'No space left on device' )
+            append_column( store, name, values )
+
+        with mock.patch.object( SunStore, '_append_column', failing_append ):
+            with self.assertRaises( OSError ):
+                self.store.add( 'TOS', self.tos, 69.65, 18.96 )
+            with self.assertRaises( OSError ):
+                self.store.add( 'RVK', self.rvk, 0, 0 )
+
+        # Nothing of the failed adds is left, in the files or the index
+        self.assertEqual( self.store.index, index )
+        self.assertEqual( SunStore( self.path ).index, index )
+        for name in col_names:
+            self.assertEqual( file_rows( self.store, name ), index['rows'] )
+
+        # and the next add is in the right rows
+        self.store.add( 'TOS', self.tos )
+        store = SunStore( self.path )
+        self.assertYear( store, 'TOS', 2020, self.tos )
+        self.assertYear( store, 'RVK', 2018, self.rvk )
+
+    def test_rows_left_by_a_crash( self ):
+        # A crash in the middle of an add leaves rows that are not indexed
+        self.store.add( 'RVK', self.rvk )
+        with open( self.store._column_path('sunrise'), 'ab' ) as f:
+            f.write( np.arange( 100, dtype=np.int32 ).tobytes() )
+
+        store = SunStore( self.path )
+        store.add( 'TOS', self.tos )
+        self.assertYear( SunStore( self.path ), 'TOS', 2020, self.tos )
+
+    def test_compact( self ):
+        self.store.add( 'RVK', self.rvk )
+        self.store.add( 'TOS', self.tos )
+        # Adding years again leaves their old rows unused
+        for _ in range( 3 ):
+            self.store.add( 'RVK', self.rvk )
+        self.assertEqual( self.store.unused_rows(), 3*len( self.rvk['date'] ) )
+
+        self.store.compact()
+        self.assertEqual( self.store.unused_rows(), 0 )
+        rows = len( self.rvk['date'] ) + len( self.tos['date'] )
+        for name in col_names:
+            self.assertEqual( file_rows( self.store, name ), rows )
+
+        store = SunStore( self.path )
+        self.assertEqual( store.index['rows'], rows )
+        self.assertYear( store, 'RVK', 2017, self.rvk )
+        self.assertYear( store, 'RVK', 2018, self.rvk )
+        self.assertYear( store, 'TOS', 2020, self.tos )
+
+        # and adds go on after the compacted rows
+        store.add( 'TOS', self.tos )
+        self.assertYear( SunStore( self.path ), 'TOS', 2020, self.tos )
+
+
+if __name__ == '__main__':
+    unittest.main()
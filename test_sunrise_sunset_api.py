@@ -0,0 +1,152 @@
+
+# Tests of sunrise_sunset_api.py against a local stand-in server.
+
+# The server answers like the API, but fails the first requests for a day
+# with the status given in the query (e.g. fail=2&status=503), and records
+# the time and the client port of each request.
+#
+# Usage:
+# python3 -m pytest test_sunrise_sunset_api.py
+# or
+# python3 -m unittest test_sunrise_sunset_api
+
+import json
+import time
+import threading
+import unittest
+import urllib.parse
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from sunrise_sunset_api import ApiFetcher, RateLimiter, RetryableError, ApiError
+
+
+RESULTS = { 'sunrise': '2018-06-21T02:55:00+00:00', 'sunset': '2018-06-22T00:03:00+00:00',
+            'solar_noon': '2018-06-21T13:29:00+00:00',
+            'civil_twilight_begin': '1970-01-01T00:00:01+00:00', 'civil_twilight_end': '1970-01-01T00:00:01+00:00' }
+
+
+class StandInHandler( BaseHTTPRequestHandler ):
+    # HTTP/1.1, so that connections are kept alive
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET( self ):
+        server = self.server
+        query = urllib.parse.parse_qs( urllib.parse.urlsplit( self.path ).query )
+        fail = int( query.get( 'fail', ['0'] )[0] )
+        status = int( query.get( 'status', ['503'] )[0] )
+
+        with server.lock:
+            server.requests.append( (time.monotonic(), self.client_address[1], query['date'][0]) )
+            attempt = server.attempts.get( query['date'][0], 0 )
+            server.attempts[ query['date'][0] ] = attempt + 1
+
+        if attempt < fail:
+            body = b'{}'
+            self.send_response( status )
+        else:
+            body = json.dumps( { 'results': dict( RESULTS, day=query['date'][0] ), 'status': 'OK' } ).encode()
+            self.send_response( 200 )
+        self.send_header( 'Content-Type', 'application/json' )
+        self.send_header( 'Content-Length', str( len(body) ) )
+        self.end_headers()
+        self.wfile.write( body )
+
+    def log_message( self, *args ):
+        pass
+
+
+class StandInTest( unittest.TestCase ):
+
+    def setUp( self ):
+        self.server = ThreadingHTTPServer( ('127.0.0.1', 0), StandInHandler )
+        self.server.lock = threading.Lock()
+        self.server.requests = []
+        self.server.attempts = {}
+        self.thread = threading.Thread( target=self.server.serve_forever, daemon=True )
+        self.thread.start()
+
+    def tearDown( self ):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def fetcher( self, query='', **options ):
+        url = 'http://127.0.0.1:%d/json' % self.server.server_address[1]
+        options = dict( dict( concurrency=1, rate_limit=None, retries=3, backoff=0.05, timeout=5 ), **options )
+        fetcher = ApiFetcher( url, **options )
+        if query:
+            # Instructions to the server, after the query of the API
+            request_path = fetcher.request_path
+            fetcher.request_path = lambda lat, lng, day: request_path( lat, lng, day ) + '&' + query
+        return fetcher
+
+    def test_results( self ):
+        days = [ '2018-06-%02d' % day for day in range(1,6) ]
+        results = self.fetcher().fetch_days( 64.1, -21.9, days )
+        self.assertEqual( [ result['day'] for result in results ], days )
+
+    def test_keep_alive( self ):
+        # One connection for all the requests of a thread
+        self.fetcher().fetch_days( 64.1, -21.9, [ '2018-06-%02d' % day for day in range(1,11) ] )
+        self.assertEqual( len( self.server.requests ), 10 )
+        self.assertEqual( len( { port for _, port, _ in self.server.requests } ), 1 )
+
+    def test_retry_with_backoff( self ):
+        for status in (429, 500, 503):
+            with self.subTest( status=status ):
+                self.server.requests.clear()
+                self.server.attempts.clear()
+                fetcher = self.fetcher( 'fail=3&status=%d' % status )
+                result = fetcher.fetch_day( 64.1, -21.9, '2018-06-21' )
+                fetcher.close()
+                self.assertEqual( result['day'], '2018-06-21' )
+
+                # Three failures, then the answer, after waits of 0.05, 0.1, 0.2 s
+                times = [ request_time for request_time, _, _ in self.server.requests ]
+                self.assertEqual( len(times), 4 )
+                for attempt, (time1, time2) in enumerate( zip( times[:-1], times[1:] ) ):
+                    self.assertGreaterEqual( time2 - time1, 0.05 * 2**attempt * 0.9 )
+
+                # The connection is reused after the failures
+                self.assertEqual( len( { port for _, port, _ in self.server.requests } ), 1 )
+
+    def test_retries_run_out( self ):
+        fetcher = self.fetcher( 'fail=10&status=503', retries=2 )
+        with self.assertRaises( RetryableError ):
+            fetcher.fetch_day( 64.1, -21.9, '2018-06-21' )
+        fetcher.close()
+        self.assertEqual( len( self.server.requests ), 3 )
+
+    def test_no_retry_on_client_error( self ):
+        fetcher = self.fetcher( 'fail=1&status=404' )
+        with self.assertRaises( ApiError ):
+            fetcher.fetch_day( 64.1, -21.9, '2018-06-21' )
+        fetcher.close()
+        self.assertEqual( len( self.server.requests ), 1 )
+
+    def test_rate_limit( self ):
+        days = [ '2018-06-%02d' % day for day in range(1,7) ]
+        self.fetcher( concurrency=3, rate_limit=20 ).fetch_days( 64.1, -21.9, days )
+        times = sorted( request_time for request_time, _, _ in self.server.requests )
+        # 6 requests at 20 per second: at least 5 intervals of 0.05 s
+        self.assertGreaterEqual( times[-1] - times[0], 5 * 0.05 * 0.9 )
+
+
+class RateLimiterTest( unittest.TestCase ):
+
+    def test_spacing( self ):
+        limiter = RateLimiter( 50 )
+        start = time.monotonic()
+        for _ in range( 6 ):
+            limiter.wait()
+        self.assertGreaterEqual( time.monotonic() - start, 5 * 0.02 * 0.9 )
+
+    def test_no_limit( self ):
+        limiter = RateLimiter( None )
+        start = time.monotonic()
+        for _ in range( 1000 ):
+            limiter.wait()
+        self.assertLess( time.monotonic() - start, 0.1 )
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+
+# Offsets from UTC on each day, from the IANA time zone database.
+
+# The offset of a day is the offset at noon (UTC) of that day,
+# so a day when the clock changes in the night counts as after the change.
+# The zone is looked at on every day (so no clock change is missed,
+# however close to the next one), once per zone and year; the results
+# are cached, so multi-year and multi-zone runs look at each zone-year once.
+# DST is never negative here: where the zone has negative DST (in winter),
+# the smaller offset is taken as standard time.
+
+import functools
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+import numpy as np
+
+
+def _zone_offsets( zone, day ):
+    # (offset from UTC, DST part of it) in seconds at noon (UTC)
+    # of day (days since 1970-01-01)
+    noon = datetime( 1970, 1, 1, 12, tzinfo=timezone.utc ) + timedelta( days=int(day) )
+    local = noon.astimezone( zone )
+    dst = local.dst()
+    return ( int( local.utcoffset().total_seconds() ),
+             0 if dst is None else int( dst.total_seconds() ) )
+
+
+@functools.lru_cache( maxsize=None )
+def _year_offsets( zone_name, year ):
+    # Offsets and DST parts on each day of the year, as read-only int32 arrays
+    zone = ZoneInfo( zone_name )
+
+    first_day = np.datetime64( '%04d-01-01' % year, 'D' ).astype(int)
+    last_day = np.datetime64( '%04d-12-31' % year, 'D' ).astype(int)
+
+    values = [ _zone_offsets( zone, day ) for day in range( first_day, last_day+1 ) ]
+    offsets, dst = np.array( values, dtype=np.int32 ).T.copy()
+
+    # Zones such as Europe/Dublin have their summer time as standard time,
+    # and negative DST in winter: count DST up from the winter offset instead
+    if dst.min() < 0:
+        dst -= dst.min()
+
+    offsets.flags.writeable = False
+    dst.flags.writeable = False
+    return offsets, dst
+
+
+def _range_offsets( zone_name, dates ):
+    dates = np.asarray( dates, dtype='datetime64[D]' )
+    years = dates.astype('datetime64[Y]').astype(int) + 1970
+
+    first_year, last_year = years.min(), years.max()
+    offsets, dst = zip( *[ _year_offsets( zone_name, year ) for year in range( first_year, last_year+1 ) ] )
+
+    # Days since January 1 of the first year
+    index = ( dates - np.datetime64( '%04d-01-01' % first_year, 'D' ) ).astype(int)
+    return np.concatenate( offsets )[index], np.concatenate( dst )[index]
+
+
+def utc_offsets( zone_name, dates ):
+    # Offset from UTC in seconds on each of the dates
+    return _range_offsets( zone_name, dates )[0]
+
+
+def dst_offsets( zone_name, dates ):
+    # The DST part of the offset from UTC in seconds on each of the dates
+    return _range_offsets( zone_name, dates )[1]